@@ -6,17 +6,32 @@ Optimized for batch processing and performance
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import os
 import time
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterable
 from datetime import datetime, timedelta
 import google.generativeai as genai
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future
 import threading
 from functools import lru_cache
+from itertools import chain
 import re
+import sqlite3
+import asyncio
+import weakref
+from collections import OrderedDict, deque
+
+from price_stats import listing_price_statistics, weighted_statistics
+
+try:
+    import fcntl  # POSIX-only; used to share rate limits across worker processes
+except ImportError:
+    fcntl = None
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -28,47 +43,1593 @@ EBAY_BROWSE_API_ENDPOINT = "https://api.ebay.com/buy/browse/v1/item_summary/sear
 
 # Google Gemini API Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')  # Get from environment variable
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'  # Model used for all listing scoring
+GEMINI_REQUEST_TIMEOUT = float(os.getenv('GEMINI_REQUEST_TIMEOUT', '60'))  # Seconds per Gemini call
+# Serve the scoring rubric from a server-side context cache. Off by default: the rubric is
+# below the minimum cached-content size of current models, so it is sent as a system instruction.
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv('GEMINI_CONTEXT_CACHE_ENABLED', '').lower() in ('1', 'true', 'yes')
+GEMINI_CONTEXT_CACHE_TTL = 3600  # Seconds a cached rubric lives on the server
+GEMINI_CONTEXT_CACHE_REFRESH_MARGIN = 60  # Recreate the cached rubric this many seconds before it expires
 
 # Performance Configuration
 MAX_CONCURRENT_REQUESTS = 3  # Increased from 1 to 3 for better performance
-AI_BATCH_SIZE = 8  # Increased from 3 to 8 for faster AI processing
+AI_BATCH_SIZE = 40  # Most listings per scoring batch; the token budgets below usually decide first
+AI_BATCH_INPUT_TOKEN_BUDGET = 1200  # Estimated listing-line tokens per batch prompt
+AI_BATCH_OUTPUT_TOKEN_BUDGET = 2048  # Estimated response tokens per batch (keeps replies clear of truncation)
+AI_RESULT_TOKEN_ESTIMATE = 90  # Estimated response tokens per scored listing
+LISTING_TITLE_MAX_CHARS = 120  # Titles are normalized and truncated to this length in prompts
+AI_MAX_CONCURRENT_BATCHES = 4  # Scoring batches in flight per query (Gemini rate limiter still applies)
+AI_BATCH_MAX_RETRIES = 6  # Re-requests per listing when batches fail or come back incomplete (~log2 of the batch size)
+AI_THROTTLE_MAX_RETRIES = 2  # Whole-batch retries after a Gemini 429/timeout (throttled batches are never split)
+AI_THROTTLE_BACKOFF = 2.0  # Seconds before the first throttled retry, doubled on each further retry
+
+# Rule-based pre-AI fast path
+RULE_ENGINE_ENABLED = True  # Decide unambiguous listings with deterministic rules instead of the AI
+RULE_MATCH_SCORE = 95  # Confidence assigned to rule-based exact matches
+RULE_REJECT_SCORE = 5  # Confidence assigned to clear year/grade/mint/series mismatches
+
+# Cross-query prompt packing (batch runs share Gemini prompts across searches)
+CROSS_QUERY_PACKING_ENABLED = True  # Pack listings from different queries into shared prompts
+PACKED_PROMPT_MAX_WAIT = 0.25  # Seconds a listing may wait for a prompt to fill up
 CACHE_TTL = 600  # Cache results for 10 minutes (increased from 5)
+CACHE_STALE_GRACE = int(os.getenv('CACHE_STALE_GRACE', '3600'))  # Seconds past CACHE_TTL a result may be served stale
+STALE_REFRESH_WORKERS = 2  # Background threads refreshing stale results
+
+# Background cache warmer (keeps popular analyses fresh before they expire)
+CACHE_WARMER_ENABLED = os.getenv('CACHE_WARMER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CACHE_WARMER_QUERIES = os.getenv('CACHE_WARMER_QUERIES', '')  # Always-watched queries, separated by ';' or newlines
+CACHE_WARMER_INTERVAL = 15  # Seconds between warmer passes over the watchlist
+CACHE_WARMER_REFRESH_AHEAD = 60  # Refresh entries this many seconds before CACHE_TTL runs out
+CACHE_WARMER_MAX_REFRESHES_PER_HOUR = int(os.getenv('CACHE_WARMER_MAX_REFRESHES_PER_HOUR', '600'))  # Per process
+CACHE_WARMER_MAX_WATCHLIST = 500  # Most queries watched (least popular learned queries dropped first)
+CACHE_WARMER_MIN_POPULARITY = 2.0  # Decayed request count before a learned query is warmed
+CACHE_WARMER_POPULARITY_HALF_LIFE = 6 * 3600  # Seconds for a query's request count to decay by half
+CACHE_WARMER_THROTTLE_PAUSE = 120  # Seconds the warmer pauses after an upstream 429 or timeout
+
+# Delta refresh (recomputed analyses only score listings that changed since the last run)
+DELTA_REFRESH_ENABLED = True  # Reuse scores of unchanged listings when an analysis is recomputed
+DELTA_SNAPSHOT_MAX_ENTRIES = 500  # Scored listing sets kept for delta refreshes (LRU)
+DELTA_SNAPSHOT_MAX_AGE = 24 * 3600  # Older snapshots are ignored and the analysis is rescored in full
 MAX_RESULTS_DEFAULT = 15  # Increased from 5 to 15 for more data
 MIN_CONFIDENCE_DEFAULT = 30  # Much lower threshold for more results
 
+# Result cache limits (analysis reports kept in memory)
+RESULT_CACHE_MAX_ENTRIES = 500  # Most cached analyses kept before LRU eviction
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Approximate memory budget for cached analyses
+RESULT_CACHE_SWEEP_INTERVAL = 60  # Seconds between background sweeps of expired entries
+
+# Persistent listing score cache configuration
+SCORE_CACHE_ENABLED = True  # Reuse AI scores for listings already seen for the same query
+SCORE_CACHE_PATH = os.getenv('SCORE_CACHE_PATH', 'listing_scores.db')  # SQLite file for cached scores
+SCORE_CACHE_MAX_AGE = 7 * 24 * 3600  # Drop cached scores older than 7 days
+SCORE_CACHE_MAX_ENTRIES = 50000  # Keep at most this many cached scores (oldest evicted first)
+SCORE_CACHE_EVICT_EVERY = 500  # Run eviction after this many writes
+
+# Historical sales store (every fresh analysis is appended for price-over-time queries)
+SALES_HISTORY_ENABLED = True  # Append scored listings from each fresh analysis
+SALES_HISTORY_PATH = os.getenv('SALES_HISTORY_PATH', 'sales_history.db')  # SQLite file for the history
+SALES_HISTORY_MAX_AGE = 365 * 24 * 3600  # Drop observations older than a year
+SALES_HISTORY_MAX_ENTRIES = 200000  # Keep at most this many observations (oldest evicted first)
+SALES_HISTORY_EVICT_EVERY = 1000  # Run eviction after this many appended rows
+
+# Listing filter rules
+COIN_FILTER_RULES_PATH = os.getenv('COIN_FILTER_RULES_PATH')  # JSON rule set; built-in rules when unset
+
+# Rate limiting configuration (one token bucket per upstream API)
+EBAY_RATE_LIMIT_PER_SEC = float(os.getenv('EBAY_RATE_LIMIT_PER_SEC', '1.25'))  # Sustained eBay calls per second
+EBAY_RATE_LIMIT_BURST = int(os.getenv('EBAY_RATE_LIMIT_BURST', '3'))  # eBay calls allowed back-to-back
+GEMINI_RATE_LIMIT_PER_SEC = float(os.getenv('GEMINI_RATE_LIMIT_PER_SEC', '0.67'))  # Sustained Gemini calls per second
+GEMINI_RATE_LIMIT_BURST = int(os.getenv('GEMINI_RATE_LIMIT_BURST', '2'))  # Gemini calls allowed back-to-back
+RATE_LIMIT_STATE_DIR = os.getenv('RATE_LIMIT_STATE_DIR')  # Set to share limits across worker processes
+
+# eBay pagination configuration
+EBAY_PAGE_SIZE = 50  # Results requested per Browse API page
+EBAY_MAX_OFFSET = 10000  # Browse API does not return results beyond this offset
+EBAY_PAGE_FETCH_WORKERS = MAX_CONCURRENT_REQUESTS  # Pages fetched concurrently per query
+
+# eBay HTTP connection pooling
+EBAY_HTTP_POOL_SIZE = MAX_CONCURRENT_REQUESTS * EBAY_PAGE_FETCH_WORKERS  # Keep-alive connections to api.ebay.com
+EBAY_HTTP_CONNECT_RETRIES = 3  # Transport-level retries on connection errors
+EBAY_HTTP_RETRY_BACKOFF = 0.3  # Backoff factor between connection retries (seconds)
+
+# Adaptive (AIMD) batch concurrency configuration
+BATCH_CONCURRENCY_INITIAL = MAX_CONCURRENT_REQUESTS  # Concurrent queries when a batch starts
+BATCH_CONCURRENCY_MIN = 1  # Never go below this many concurrent queries
+BATCH_CONCURRENCY_MAX = 10  # Never go above this many concurrent queries
+BATCH_LATENCY_TARGET = 30.0  # Seconds per query considered healthy; slower queries stop growth
+BATCH_BACKOFF_COOLDOWN = 5.0  # Seconds after a backoff before another backoff or increase
+
+# Asyncio pipeline configuration (in-flight calls allowed per upstream)
+ASYNC_EBAY_CONCURRENCY = 4  # Concurrent eBay requests in the async pipeline
+ASYNC_GEMINI_CONCURRENCY = 4  # Concurrent Gemini batch requests in the async pipeline
+
 # Thread-local storage for API rate limiting
 thread_local = threading.local()
 
-# Simple in-memory cache for results
-_result_cache = {}
-_cache_timestamps = {}
 
-# Rate limiting for API calls
-_last_api_call = 0
-_api_call_interval = 1.5  # Reduced from 2.0 to 1.5 seconds between API calls
-_ebay_api_call_interval = 0.8  # Reduced from 1.0 to 0.8 seconds between eBay API calls
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate for prompt budgeting (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+# Seller boilerplate that carries no information about the coin
+_TITLE_NOISE_PATTERN = re.compile(
+    r'\b(free\s+(?:fast\s+)?shipping|fast\s+(?:free\s+)?ship(?:ping)?|ships?\s+(?:free|fast|today)|'
+    r'same\s+day\s+ship(?:ping)?|no\s+reserve|must\s+see|wow)\b|l@@k',
+    re.IGNORECASE
+)
+_TITLE_SYMBOL_PATTERN = re.compile(r'[^\w\s$/.,#&()\-\'"+%]')
+
+def normalize_listing_title(title: str, max_chars: int = LISTING_TITLE_MAX_CHARS) -> str:
+    """
+    Clean a listing title for use in a prompt.
+    Drops emoji and decorative symbols, shipping/seller boilerplate and repeated
+    punctuation, collapses whitespace and truncates at a word boundary.
+    """
+    title = _TITLE_NOISE_PATTERN.sub(' ', title or '')
+    title = _TITLE_SYMBOL_PATTERN.sub(' ', title)
+    title = re.sub(r'([!.,\-#*~])\1+', r'\1', title)
+    title = ' '.join(title.split()).strip(' -,')
+    if len(title) > max_chars:
+        title = title[:max_chars].rsplit(' ', 1)[0]
+    return title
+
+def normalize_search_query(search_query: str) -> str:
+    """Normalize a search query for use as a cache/storage key (case and whitespace insensitive)."""
+    return ' '.join((search_query or '').lower().split())
+
+# --- Rate Limiting ---
+
+class TokenBucketRateLimiter:
+    """
+    Token-bucket rate limiter for a single upstream API.
+    Thread-safe; when state_path is given the bucket is stored in a file guarded by
+    an exclusive lock so every worker process shares the same quota.
+    """
+    
+    def __init__(self, name: str, rate: float, burst: int, state_path: str = None):
+        """
+        Args:
+            name: Upstream name used in logs and stats
+            rate: Tokens added per second (sustained requests per second)
+            burst: Bucket capacity (requests allowed back-to-back)
+            state_path: Optional file used to share the bucket across processes
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.state_path = state_path if fcntl else None
+        self.total_acquired = 0
+        self.total_wait_seconds = 0.0
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+    
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the bucket, going into debt if necessary.
+        
+        Returns:
+            Seconds the caller must wait before making its request
+        """
+        with self._lock:
+            if self.state_path:
+                wait = self._reserve_shared(tokens)
+            else:
+                self._tokens, self._updated, wait = self._take(self._tokens, self._updated, tokens)
+            self.total_acquired += 1
+            self.total_wait_seconds += wait
+            return wait
+    
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens are available. Returns the time spent waiting."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.info(f"⏳ Rate limiting ({self.name}): waiting {wait:.1f}s")
+            time.sleep(wait)
+        return wait
+    
+    def _take(self, available: float, updated: float, tokens: float):
+        """Refill the bucket up to now and take tokens. Returns (tokens_left, now, wait)."""
+        now = time.time()
+        available = min(float(self.burst), available + max(0.0, now - updated) * self.rate)
+        available -= tokens
+        wait = -available / self.rate if available < 0 else 0.0
+        return available, now, wait
+    
+    def _reserve_shared(self, tokens: float) -> float:
+        """Reserve tokens from the bucket stored in state_path (cross-process)."""
+        with open(self.state_path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except json.JSONDecodeError:
+                    state = {}
+                available, updated, wait = self._take(
+                    state.get('tokens', float(self.burst)), state.get('updated', time.time()), tokens
+                )
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': available, 'updated': updated}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return wait
+    
+    def stats(self) -> Dict:
+        """Return limiter configuration and usage counters."""
+        return {
+            'rate_per_second': self.rate,
+            'burst': self.burst,
+            'shared_across_processes': bool(self.state_path),
+            'total_acquired': self.total_acquired,
+            'total_wait_seconds': round(self.total_wait_seconds, 2)
+        }
+
+def _rate_limit_state_path(name: str):
+    """Return the shared state file for a limiter, or None when limits are per-process."""
+    if not RATE_LIMIT_STATE_DIR:
+        return None
+    return os.path.join(RATE_LIMIT_STATE_DIR, f"{name}_rate_limit.json")
+
+# Independent limiters so eBay calls never delay Gemini calls (and vice versa)
+ebay_rate_limiter = TokenBucketRateLimiter(
+    'ebay', EBAY_RATE_LIMIT_PER_SEC, EBAY_RATE_LIMIT_BURST, _rate_limit_state_path('ebay')
+)
+gemini_rate_limiter = TokenBucketRateLimiter(
+    'gemini', GEMINI_RATE_LIMIT_PER_SEC, GEMINI_RATE_LIMIT_BURST, _rate_limit_state_path('gemini')
+)
+
+# Per-event-loop semaphores bounding in-flight calls in the async pipeline
+_async_semaphores = weakref.WeakKeyDictionary()
+
+def _async_semaphore(upstream: str) -> asyncio.Semaphore:
+    """Return the concurrency semaphore for an upstream ('ebay' or 'gemini') on the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphores = _async_semaphores.get(loop)
+    if semaphores is None:
+        semaphores = {
+            'ebay': asyncio.Semaphore(ASYNC_EBAY_CONCURRENCY),
+            'gemini': asyncio.Semaphore(ASYNC_GEMINI_CONCURRENCY)
+        }
+        _async_semaphores[loop] = semaphores
+    return semaphores[upstream]
+
+# --- Adaptive Concurrency ---
+
+class AdaptiveConcurrencyController:
+    """
+    AIMD (additive increase, multiplicative decrease) concurrency limiter.
+    Each healthy completion grows the limit by 1/limit (about +1 per round of work);
+    a 429, timeout or failure halves it. Backoffs are spaced by a cooldown so one
+    burst of throttled calls doesn't collapse the limit to the minimum.
+    """
+    
+    def __init__(self, name: str, initial: int = BATCH_CONCURRENCY_INITIAL, min_limit: int = BATCH_CONCURRENCY_MIN,
+                 max_limit: int = BATCH_CONCURRENCY_MAX, latency_target: float = BATCH_LATENCY_TARGET,
+                 cooldown: float = BATCH_BACKOFF_COOLDOWN):
+        """Create a controller starting at `initial` concurrent slots."""
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.backoffs = 0
+        self.throttles = {}  # upstream -> throttle events seen
+        self.avg_latency = None
+        self._last_backoff = 0.0
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        """Block until a slot is free under the current limit."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+    
+    def release(self, latency: float, success: bool = True):
+        """Free a slot and adjust the limit from the outcome of the finished task."""
+        with self._cond:
+            self.in_flight -= 1
+            self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+            if success:
+                self.successes += 1
+                cooled_down = time.time() - self._last_backoff >= self.cooldown
+                if latency <= self.latency_target and cooled_down:
+                    self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            else:
+                self.failures += 1
+                self._backoff_locked()
+            self._cond.notify_all()
+    
+    def record_throttle(self, upstream: str, reason: str):
+        """Record a 429/timeout from an upstream and back off."""
+        with self._cond:
+            self.throttles[upstream] = self.throttles.get(upstream, 0) + 1
+            if self._backoff_locked():
+                logger.warning(f"🐢 {self.name}: {upstream} {reason}, concurrency limit now {int(self.limit)}")
+    
+    def _backoff_locked(self) -> bool:
+        """Halve the limit unless we backed off within the cooldown. Caller must hold the lock."""
+        now = time.time()
+        if now - self._last_backoff < self.cooldown:
+            return False
+        self._last_backoff = now
+        self.limit = max(float(self.min_limit), self.limit / 2)
+        self.backoffs += 1
+        return True
+    
+    def stats(self) -> Dict:
+        """Return the current limit and health counters."""
+        with self._cond:
+            return {
+                'current_limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'successes': self.successes,
+                'failures': self.failures,
+                'backoffs': self.backoffs,
+                'throttles': dict(self.throttles),
+                'avg_latency_seconds': round(self.avg_latency, 2) if self.avg_latency is not None else None
+            }
+
+# Shared controller for batch query concurrency, fed by eBay and Gemini throttling signals
+batch_concurrency = AdaptiveConcurrencyController('batch')
+
+def _is_throttling_error(error: Exception) -> bool:
+    """Check whether an upstream exception means we're over quota or timing out."""
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    return type(error).__name__ in ('ResourceExhausted', 'TooManyRequests', 'DeadlineExceeded', 'ServiceUnavailable') \
+        or '429' in str(error)
+
+def get_concurrency_stats() -> Dict:
+    """Return stats for the adaptive batch concurrency controller."""
+    return batch_concurrency.stats()
+
+def get_rate_limiter_stats() -> Dict:
+    """Return stats for every upstream rate limiter."""
+    return {
+        'ebay': ebay_rate_limiter.stats(),
+        'gemini': gemini_rate_limiter.stats()
+    }
+
+# --- Result Cache ---
+
+class AnalysisResultCache:
+    """
+    Bounded, thread-safe LRU cache with a TTL for analysis results.
+    Limits both entry count and approximate size in bytes; a background daemon
+    thread sweeps expired entries so memory is released even for keys that are
+    never requested again. Expired entries are kept for a further stale_grace
+    seconds so callers that opt in can serve them while a refresh runs.
+    """
+    
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES, sweep_interval: float = RESULT_CACHE_SWEEP_INTERVAL,
+                 stale_grace: float = CACHE_STALE_GRACE):
+        """Create an empty cache; the sweeper thread starts on the first write."""
+        self.ttl = ttl
+        self.stale_grace = stale_grace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, stored_at, size_bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper = None
+    
+    def get(self, key: str):
+        """Return the cached value, or None if missing or expired."""
+        value, _ = self.get_with_age(key)
+        return value
+    
+    def get_with_age(self, key: str, allow_stale: bool = False):
+        """
+        Look up an entry.
+        
+        Args:
+            key: Cache key
+            allow_stale: Also return entries past the TTL but within the stale grace window
+            
+        Returns:
+            (value, age_seconds), or (None, None) if missing or expired; the caller can
+            compare the age with ttl to tell a stale entry from a fresh one
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            
+            value, stored_at, _ = entry
+            age = time.time() - stored_at
+            if age >= self.ttl:
+                if age >= self.ttl + self.stale_grace:
+                    self._remove_locked(key)
+                    self.expirations += 1
+                elif allow_stale:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return value, age
+                self.misses += 1
+                return None, None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value, age
+    
+    def age(self, key: str):
+        """Return the age in seconds of an entry (fresh or stale), or None; does not touch LRU order or stats."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return time.time() - entry[1]
+    
+    def set(self, key: str, value, stored_at: float = None):
+        """Store a value, evicting least recently used entries to stay within limits."""
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            logger.warning(f"⚠️  Result for '{key}' ({size} bytes) exceeds cache budget; not cached")
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (value, stored_at if stored_at is not None else time.time(), size)
+            self._bytes += size
+            
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self.evictions += 1
+        
+        self._ensure_sweeper()
+    
+    def delete(self, key: str):
+        """Remove an entry if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+    
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def sweep(self) -> int:
+        """Remove all entries past the TTL and stale grace window. Returns the number removed."""
+        cutoff = time.time() - self.ttl - self.stale_grace
+        with self._lock:
+            expired = [key for key, (_, stored_at, _) in self._entries.items() if stored_at <= cutoff]
+            for key in expired:
+                self._remove_locked(key)
+            self.expirations += len(expired)
+        return len(expired)
+    
+    def stats(self) -> Dict:
+        """Return hit/miss/eviction counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'stale_grace_seconds': self.stale_grace
+            }
+    
+    def _remove_locked(self, key: str):
+        """Drop an entry and its size accounting. Caller must hold the lock."""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+    
+    @staticmethod
+    def _estimate_size(value) -> int:
+        """Approximate an entry's memory footprint by its serialized JSON size."""
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return 0
+    
+    def _ensure_sweeper(self):
+        """Start the background TTL sweeper thread if it isn't running."""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='result-cache-sweeper', daemon=True)
+            self._sweeper.start()
+    
+    def _sweep_loop(self):
+        """Periodically remove expired entries."""
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"🧹 Result cache sweep removed {removed} expired entries")
+            except Exception as e:
+                logger.error(f"❌ Result cache sweep failed: {e}")
+
+# In-memory cache for analysis results
+_result_cache = AnalysisResultCache()
+
+def get_result_cache_stats() -> Dict:
+    """Return stats for the analysis result cache."""
+    return _result_cache.stats()
+
+# --- Request Coalescing ---
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key.
+    The first caller (the leader) computes the value; callers arriving while it is
+    in flight wait on the same future and receive the same result or exception.
+    Sync and async callers share one registry, so a batch thread and an async
+    request for the same analysis also coalesce.
+    """
+    
+    def __init__(self):
+        """Create an empty in-flight registry."""
+        self.leaders = 0
+        self.coalesced = 0
+        self._in_flight = {}  # key -> concurrent.futures.Future
+        self._lock = threading.Lock()
+    
+    def _join(self, key: str):
+        """Return (future, is_leader) for key, registering a new future if none is in flight."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self.leaders += 1
+            return future, True
+    
+    def _finish(self, key: str):
+        """Forget the in-flight future for key."""
+        with self._lock:
+            self._in_flight.pop(key, None)
+    
+    def do(self, key: str, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) once per key among concurrent callers and return its result."""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            logger.info(f"🔗 Joining in-flight computation for '{key}'")
+            return future.result()
+        
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key)
+    
+    async def do_async(self, key: str, coro_fn, *args, **kwargs):
+        """Async variant of do(); coro_fn is awaited by the leader only."""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            logger.info(f"🔗 Joining in-flight computation for '{key}'")
+            return await asyncio.wrap_future(future)
+        
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key)
+    
+    def in_flight(self, key: str) -> bool:
+        """Whether a computation for key is currently running."""
+        with self._lock:
+            return key in self._in_flight
+    
+    def stats(self) -> Dict:
+        """Return in-flight and coalescing counters."""
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced
+            }
+
+# In-flight analyses keyed by result cache key
+_analysis_flights = SingleFlight()
+
+def get_single_flight_stats() -> Dict:
+    """Return stats for in-flight analysis coalescing."""
+    return _analysis_flights.stats()
+
+# --- Persistent Score Cache ---
+
+class ListingScoreCache:
+    """
+    Durable SQLite store of per-listing confidence scores.
+    Keyed by (normalized search query, itemId) so repeat runs only send never-seen listings to the AI.
+    The normalized title is stored with each score; a listing retitled since it was
+    scored (e.g. a changed grade) is a miss and gets rescored.
+    """
+    
+    def __init__(self, db_path: str = SCORE_CACHE_PATH, max_age: float = SCORE_CACHE_MAX_AGE,
+                 max_entries: int = SCORE_CACHE_MAX_ENTRIES):
+        """Open (or create) the score database at db_path."""
+        self.db_path = db_path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes_since_eviction = 0
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS listing_scores ("
+            " query TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " title TEXT NOT NULL DEFAULT '',"
+            " confidence_analysis TEXT NOT NULL,"
+            " scored_at REAL NOT NULL,"
+            " PRIMARY KEY (query, item_id))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(listing_scores)")}
+        if 'title' not in columns:
+            # Databases created before titles were stored; their rows miss once and are rescored
+            self._conn.execute("ALTER TABLE listing_scores ADD COLUMN title TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_listing_scores_scored_at ON listing_scores (scored_at)")
+        self._conn.commit()
+    
+    @staticmethod
+    def _title_key(title: str) -> str:
+        """Title as the AI saw it, case-folded, for detecting retitled listings."""
+        return normalize_listing_title(str(title or '')).lower()
+    
+    def get_many(self, search_query: str, listings: List[Dict]) -> Dict[str, Dict]:
+        """
+        Look up cached scores for a set of listings.
+        
+        Args:
+            search_query: Original search query
+            listings: Listings to look up (itemId and title are used)
+            
+        Returns:
+            Dictionary mapping itemId to its cached confidence_analysis, for listings
+            whose title is unchanged since they were scored
+        """
+        query = normalize_search_query(search_query)
+        titles = {
+            listing.get('itemId'): self._title_key(listing.get('title'))
+            for listing in listings
+            if listing.get('itemId') and listing.get('itemId') != 'N/A'
+        }
+        valid_ids = list(titles)
+        cutoff = time.time() - self.max_age
+        found = {}
+        
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look up in chunks
+            for i in range(0, len(valid_ids), 500):
+                chunk = valid_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT item_id, title, confidence_analysis FROM listing_scores "
+                    f"WHERE query = ? AND scored_at >= ? AND item_id IN ({placeholders})",
+                    [query, cutoff] + chunk
+                ).fetchall()
+                for item_id, title, confidence_json in rows:
+                    if title == titles[item_id]:
+                        analysis = json.loads(confidence_json)
+                        analysis.pop('token_usage', None)  # Rows written before usage was kept out of the cache
+                        found[item_id] = analysis
+            
+            self.hits += len(found)
+            self.misses += len(listings) - len(found)
+        
+        return found
+    
+    def put_many(self, search_query: str, listings: List[Dict]):
+        """Store the confidence_analysis of scored listings (with their titles) for a search query."""
+        query = normalize_search_query(search_query)
+        now = time.time()
+        rows = [
+            (query, listing['itemId'], self._title_key(listing.get('title')),
+             json.dumps({key: value for key, value in listing['confidence_analysis'].items() if key != 'token_usage'}),
+             now)
+            for listing in listings
+            if listing.get('itemId') and listing['itemId'] != 'N/A' and 'confidence_analysis' in listing
+        ]
+        if not rows:
+            return
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO listing_scores (query, item_id, title, confidence_analysis, scored_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._writes_since_eviction += len(rows)
+            if self._writes_since_eviction >= SCORE_CACHE_EVICT_EVERY:
+                self._evict_locked()
+    
+    def evict(self) -> int:
+        """Remove expired scores and trim the store to max_entries. Returns number of rows removed."""
+        with self._lock:
+            return self._evict_locked()
+    
+    def _evict_locked(self) -> int:
+        """Eviction by age, then by size (oldest first). Caller must hold the lock."""
+        cutoff = time.time() - self.max_age
+        removed = self._conn.execute("DELETE FROM listing_scores WHERE scored_at < ?", (cutoff,)).rowcount
+        
+        total = self._conn.execute("SELECT COUNT(*) FROM listing_scores").fetchone()[0]
+        if total > self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM listing_scores WHERE rowid IN "
+                "(SELECT rowid FROM listing_scores ORDER BY scored_at ASC LIMIT ?)",
+                (total - self.max_entries,)
+            ).rowcount
+        
+        self._conn.commit()
+        self._writes_since_eviction = 0
+        self.evictions += removed
+        return removed
+    
+    def stats(self) -> Dict:
+        """Return hit/miss/eviction counters and current size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM listing_scores").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'max_entries': self.max_entries,
+                'max_age_seconds': self.max_age
+            }
+
+_score_cache = None
+_score_cache_lock = threading.Lock()
+
+def get_score_cache() -> ListingScoreCache:
+    """Return the shared process-wide listing score cache, creating it on first use."""
+    global _score_cache
+    if _score_cache is None:
+        with _score_cache_lock:
+            if _score_cache is None:
+                _score_cache = ListingScoreCache()
+    return _score_cache
+
+# --- Sales History Store ---
+
+# SQLite strftime formats for price-over-time buckets
+HISTORY_BUCKET_FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'}
+
+class SalesHistoryStore:
+    """
+    Append-only SQLite log of scored listings, indexed by canonical query, itemId and
+    observation time. Every fresh analysis adds the listings that are new or whose price,
+    shipping or score changed since their last observation, so price trends and repeat
+    lookups can be answered from disk without calling eBay or Gemini. Bounded by age and row count.
+    """
+    
+    def __init__(self, db_path: str = SALES_HISTORY_PATH, max_age: float = SALES_HISTORY_MAX_AGE,
+                 max_entries: int = SALES_HISTORY_MAX_ENTRIES):
+        """Open (or create) the history database at db_path."""
+        self.db_path = db_path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.appended = 0
+        self.unchanged_skipped = 0
+        self.evictions = 0
+        self._writes_since_eviction = 0
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sales_history ("
+            " query TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " observed_at REAL NOT NULL,"
+            " title TEXT,"
+            " price REAL,"
+            " shipping REAL,"
+            " currency TEXT,"
+            " confidence_score REAL,"
+            " scoring_method TEXT,"
+            " PRIMARY KEY (query, item_id, observed_at))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_history_query_time ON sales_history (query, observed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_history_item ON sales_history (item_id, observed_at)")
+        self._conn.commit()
+    
+    @staticmethod
+    def _to_float(value):
+        """Parse a price field, returning None for 'N/A' or malformed values."""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    
+    def append(self, search_query: str, listings: List[Dict], observed_at: float = None) -> int:
+        """
+        Record scored listings observed for a query.
+        Listings whose price, shipping and confidence score match their latest
+        observation for the query are skipped, so repeated refreshes don't grow the store.
+        
+        Args:
+            search_query: Original search query (stored normalized)
+            listings: Listings with confidence_analysis
+            observed_at: Observation timestamp (defaults to now)
+            
+        Returns:
+            Number of rows appended
+        """
+        query = normalize_search_query(search_query)
+        observed_at = observed_at or time.time()
+        rows = [
+            (
+                query, listing['itemId'], observed_at, listing.get('title'),
+                self._to_float(listing.get('soldPrice')), self._to_float(listing.get('shippingCost')),
+                listing.get('currency'),
+                listing.get('confidence_analysis', {}).get('confidence_score'),
+                listing.get('confidence_analysis', {}).get('scoring_method', 'ai')
+            )
+            for listing in listings
+            if listing.get('itemId') and listing['itemId'] != 'N/A'
+        ]
+        if not rows:
+            return 0
+        
+        with self._lock:
+            latest = self._latest_observations_locked(query, [row[1] for row in rows])
+            new_rows = [row for row in rows if latest.get(row[1]) != (row[4], row[5], row[7])]
+            self.unchanged_skipped += len(rows) - len(new_rows)
+            rows = new_rows
+            if not rows:
+                return 0
+            
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sales_history (query, item_id, observed_at, title, price, shipping, "
+                "currency, confidence_score, scoring_method) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self.appended += len(rows)
+            self._writes_since_eviction += len(rows)
+            if self._writes_since_eviction >= SALES_HISTORY_EVICT_EVERY:
+                self._evict_locked()
+        return len(rows)
+    
+    def _latest_observations_locked(self, query: str, item_ids: List[str]) -> Dict[str, tuple]:
+        """Map itemId -> (price, shipping, confidence_score) of its latest observation. Caller must hold the lock."""
+        latest = {}
+        item_ids = list(set(item_ids))
+        # SQLite limits the number of bound parameters, so look up in chunks
+        for i in range(0, len(item_ids), 500):
+            chunk = item_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            # SQLite returns the other columns from the row holding MAX(observed_at)
+            for item_id, price, shipping, confidence, _ in self._conn.execute(
+                f"SELECT item_id, price, shipping, confidence_score, MAX(observed_at) FROM sales_history "
+                f"WHERE query = ? AND item_id IN ({placeholders}) GROUP BY item_id",
+                [query] + chunk
+            ):
+                latest[item_id] = (price, shipping, confidence)
+        return latest
+    
+    def price_history(self, search_query: str, days: int = 90, bucket: str = 'day',
+                      min_confidence: float = 0) -> Dict:
+        """
+        Confidence-weighted price statistics per time bucket, answered from the store only.
+        A listing seen several times within one bucket counts once (its latest observation).
+        
+        Args:
+            search_query: Original search query
+            days: How far back to look
+            bucket: 'day', 'week' or 'month'
+            min_confidence: Ignore observations scored below this confidence
+            
+        Returns:
+            Dictionary with one point per bucket (oldest first)
+        """
+        if bucket not in HISTORY_BUCKET_FORMATS:
+            raise ValueError(f"bucket must be one of {', '.join(HISTORY_BUCKET_FORMATS)}")
+        
+        query = normalize_search_query(search_query)
+        since = time.time() - days * 86400
+        
+        with self._lock:
+            # SQLite returns the other columns from the row holding MAX(observed_at)
+            rows = self._conn.execute(
+                "SELECT strftime(?, observed_at, 'unixepoch') AS period, item_id, price, shipping, "
+                "confidence_score, MAX(observed_at) FROM sales_history "
+                "WHERE query = ? AND observed_at >= ? AND price IS NOT NULL AND confidence_score >= ? "
+                "GROUP BY period, item_id ORDER BY period",
+                (HISTORY_BUCKET_FORMATS[bucket], query, since, min_confidence)
+            ).fetchall()
+        
+        periods = OrderedDict()
+        for period, _, price, shipping, confidence, _ in rows:
+            periods.setdefault(period, []).append((
+                price, np.nan if shipping is None else shipping, confidence / 100.0
+            ))
+        
+        points = []
+        for period, observations in periods.items():
+            prices, shipping, weights = (np.array(column, dtype=float) for column in zip(*observations))
+            stats = weighted_statistics(prices, weights, shipping)
+            points.append(dict(stats, period=period))
+        
+        return {
+            'search_query': search_query,
+            'bucket': bucket,
+            'days': days,
+            'min_confidence': min_confidence,
+            'observations': len(rows),
+            'points': points
+        }
+    
+    def evict(self) -> int:
+        """Remove observations older than max_age and trim the store to max_entries. Returns number of rows removed."""
+        with self._lock:
+            return self._evict_locked()
+    
+    def _evict_locked(self) -> int:
+        """Eviction by age, then by size (oldest first). Caller must hold the lock."""
+        cutoff = time.time() - self.max_age
+        removed = self._conn.execute("DELETE FROM sales_history WHERE observed_at < ?", (cutoff,)).rowcount
+        
+        total = self._conn.execute("SELECT COUNT(*) FROM sales_history").fetchone()[0]
+        if total > self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM sales_history WHERE rowid IN "
+                "(SELECT rowid FROM sales_history ORDER BY observed_at ASC LIMIT ?)",
+                (total - self.max_entries,)
+            ).rowcount
+        
+        self._conn.commit()
+        self._writes_since_eviction = 0
+        self.evictions += removed
+        return removed
+    
+    def stats(self) -> Dict:
+        """Return store size and write counters."""
+        with self._lock:
+            entries, queries = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT query) FROM sales_history"
+            ).fetchone()
+            return {
+                'entries': entries,
+                'queries': queries,
+                'appended': self.appended,
+                'unchanged_skipped': self.unchanged_skipped,
+                'evictions': self.evictions,
+                'max_entries': self.max_entries,
+                'max_age_seconds': self.max_age
+            }
+
+_sales_history = None
+_sales_history_lock = threading.Lock()
+
+def get_sales_history() -> SalesHistoryStore:
+    """Return the shared process-wide sales history store, creating it on first use."""
+    global _sales_history
+    if _sales_history is None:
+        with _sales_history_lock:
+            if _sales_history is None:
+                _sales_history = SalesHistoryStore()
+    return _sales_history
+
+def _record_sales_history(search_query: str, scored_listings: List[Dict]):
+    """
+    Append every listing scored by a fresh analysis (regardless of the requester's
+    min_confidence) to the history store; history failures never fail the analysis.
+    """
+    if not SALES_HISTORY_ENABLED:
+        return
+    try:
+        appended = get_sales_history().append(search_query, scored_listings)
+        logger.info(f"🗄️  Recorded {appended} listings in sales history for '{search_query}'")
+    except Exception as e:
+        logger.error(f"❌ Failed to record sales history: {e}")
+
+# --- Rule-Based Coin Matching ---
+
+# Known coin series, most specific first; each maps to a canonical series name
+COIN_SERIES_PATTERNS = [
+    (r'\bsilver\s+eagles?\b|\bases?\b', 'silver eagle'),
+    (r'\bgold\s+eagles?\b', 'gold eagle'),
+    (r'\bplatinum\s+eagles?\b', 'platinum eagle'),
+    (r'\bgold\s+buffalo\b', 'gold buffalo'),
+    (r'\bbuffalo\s+nickel\b', 'buffalo nickel'),
+    (r'\bwalking\s+liberty\b', 'walking liberty half'),
+    (r'\bstanding\s+liberty\b', 'standing liberty quarter'),
+    (r'\bmercury\s+dimes?\b', 'mercury dime'),
+    (r'\bmorgan\b', 'morgan dollar'),
+    (r'\bpeace\s+dollars?\b', 'peace dollar'),
+    (r'\bfranklin\b', 'franklin half'),
+    (r'\bkennedy\b', 'kennedy half'),
+    (r'\bbarber\b', 'barber'),
+    (r'\bindian\s+head\b', 'indian head'),
+    (r'\bsaint[\s-]+gaudens\b|\bst\.?\s+gaudens\b', 'saint gaudens'),
+    (r'\bmaple\s+leaf\b', 'maple leaf'),
+    (r'\bkrugerrand\b', 'krugerrand'),
+    (r'\bbritannia\b', 'britannia'),
+    (r'\bpanda\b', 'panda'),
+    (r'\bphilharmonic\b', 'philharmonic'),
+    (r'\bkookaburra\b', 'kookaburra'),
+    (r'\blibertad\b', 'libertad'),
+]
+
+# Words that make a listing ambiguous enough to always need the AI: multiples and
+# quantities, accessories, alterations, fakes, varieties and hedged descriptions ("?")
+AMBIGUOUS_LISTING_PATTERN = re.compile(
+    r'\b(lot|lots|set|sets|roll|rolls|tube|monster\s+box|replica|copy|tribute|plated|token|'
+    r'medal|round|details|cleaned|damaged|holed|mixed|random|dates?\s+vary|our\s+choice|'
+    r'box|boxes|display|capsules?|coa|ogp|holders?|cases?|only|empty|'
+    r'fake|counterfeit|colou?ri[sz]ed|gilded|painted|not|ungraded|type\s*-?\s*[12]|'
+    r'\d+\s*(?:coins|pcs|pieces)|x\s*\d+|\d+\s*x|qty|quantity)\b|\?'
+)
+
+_YEAR_PATTERN = re.compile(r'\b(17[89]\d|18\d{2}|19\d{2}|20\d{2})\b')
+_MINT_MARK_PATTERN = re.compile(r'\b(?:17|18|19|20)\d{2}\s*-?\s*(cc|p|d|s|w|o)\b')
+_GRADE_PATTERN = re.compile(r'\b(ms|pr|pf|sp|au|xf|ef|vf)\s*-?\s*(\d{2})\b')
+_GRADING_SERVICE_PATTERN = re.compile(r'\b(pcgs|ngc|anacs|icg)\b')
+_WEIGHT_PATTERN = re.compile(r'\b(\d+\s*/\s*\d+|\d+(?:\.\d+)?)\s*-?\s*(?:oz|ounce)\b')
+_DENOMINATION_PATTERN = re.compile(r'(\$\s*\d+)\b|\b(half\s+dollar|dollar|quarter|dime|nickel|cent|penny)\b')
+_PROOF_PATTERN = re.compile(r'\b(proof|pf|pr)\b')
+_UNCIRCULATED_PATTERN = re.compile(r'\b(bu|unc|uncirculated|brilliant\s+uncirculated|ms)\b')
+
+def parse_coin_attributes(text: str) -> Dict:
+    """
+    Parse a search query or listing title into structured coin attributes.
+    
+    Args:
+        text: Query or title text (e.g., "2005-W 1/10 oz Proof Gold Eagle $5 PCGS PR70")
+        
+    Returns:
+        Dictionary with years, mint_mark, weight, denomination, series, grade,
+        grading_service, strike ('proof'/'uncirculated'/None) and ambiguous flag
+    """
+    text = (text or '').lower()
+    
+    grade_match = _GRADE_PATTERN.search(text)
+    grade = None
+    if grade_match:
+        prefix = 'pr' if grade_match.group(1) == 'pf' else grade_match.group(1)
+        grade = f"{prefix}{grade_match.group(2)}".upper()
+    
+    weight_match = _WEIGHT_PATTERN.search(text)
+    denomination_match = _DENOMINATION_PATTERN.search(text)
+    mint_mark_match = _MINT_MARK_PATTERN.search(text)
+    service_match = _GRADING_SERVICE_PATTERN.search(text)
+    
+    # Attached grades (PR70, MS69) imply the strike as well as standalone words do
+    if _PROOF_PATTERN.search(text) or (grade or '').startswith('PR'):
+        strike = 'proof'
+    elif _UNCIRCULATED_PATTERN.search(text) or (grade or '').startswith('MS'):
+        strike = 'uncirculated'
+    else:
+        strike = None
+    
+    return {
+        'years': sorted(set(_YEAR_PATTERN.findall(text))),
+        'mint_mark': mint_mark_match.group(1).upper() if mint_mark_match else None,
+        'weight': re.sub(r'\s+', '', weight_match.group(1)) if weight_match else None,
+        'denomination': re.sub(r'\s+', '', denomination_match.group(0)) if denomination_match else None,
+        'series': sorted({name for pattern, name in COIN_SERIES_PATTERNS if re.search(pattern, text)}),
+        'grade': grade,
+        'grading_service': service_match.group(1).upper() if service_match else None,
+        'strike': strike,
+        'ambiguous': bool(AMBIGUOUS_LISTING_PATTERN.search(text))
+    }
+
+def rule_based_confidence(query_attributes: Dict, title: str):
+    """
+    Decide obvious matches and mismatches without the AI.
+    
+    Args:
+        query_attributes: parse_coin_attributes() output for the search query
+        title: Listing title
+        
+    Returns:
+        confidence_analysis dictionary tagged scoring_method='rule', or None when the
+        listing is ambiguous and should go to the AI
+    """
+    title_attributes = parse_coin_attributes(title)
+    mismatches = []
+    
+    # Clear mismatches are only trusted for single-coin listings (one year in the title)
+    if len(title_attributes['years']) <= 1:
+        if query_attributes['years'] and title_attributes['years'] \
+                and not set(query_attributes['years']) & set(title_attributes['years']):
+            mismatches.append(f"Year {title_attributes['years'][0]} does not match {'/'.join(query_attributes['years'])}")
+        if query_attributes['grade'] and title_attributes['grade'] \
+                and query_attributes['grade'] != title_attributes['grade']:
+            mismatches.append(f"Grade {title_attributes['grade']} does not match {query_attributes['grade']}")
+        if query_attributes['mint_mark'] and title_attributes['mint_mark'] \
+                and query_attributes['mint_mark'] != title_attributes['mint_mark']:
+            mismatches.append(f"Mint mark {title_attributes['mint_mark']} does not match {query_attributes['mint_mark']}")
+        if query_attributes['series'] and title_attributes['series'] \
+                and not set(query_attributes['series']) & set(title_attributes['series']):
+            mismatches.append(f"Series {', '.join(title_attributes['series'])} does not match {', '.join(query_attributes['series'])}")
+    
+    if mismatches:
+        return {
+            'confidence_score': RULE_REJECT_SCORE,
+            'reasoning': '; '.join(mismatches),
+            'key_factors': mismatches,
+            'red_flags': mismatches,
+            'match_quality': 'poor',
+            'scoring_method': 'rule'
+        }
+    
+    if title_attributes['ambiguous'] or not query_attributes['years'] or not query_attributes['series']:
+        return None
+    
+    # A proof listing for a query that names no strike (usually bullion) needs the AI to judge
+    if query_attributes['strike'] is None and title_attributes['strike'] == 'proof':
+        return None
+    
+    # Exact match: every attribute the query specifies is present and equal in the title
+    matched = []
+    for attribute in ('mint_mark', 'weight', 'denomination', 'grade', 'grading_service', 'strike'):
+        wanted = query_attributes[attribute]
+        if wanted is None:
+            continue
+        if title_attributes[attribute] != wanted:
+            return None
+        matched.append(f"{attribute.replace('_', ' ')} {wanted}")
+    
+    if title_attributes['years'] != query_attributes['years'] \
+            or not set(query_attributes['series']) <= set(title_attributes['series']):
+        return None
+    
+    key_factors = [f"{'/'.join(query_attributes['years'])} year matches",
+                   f"{', '.join(query_attributes['series'])} series matches"] + [f"{factor} matches" for factor in matched]
+    return {
+        'confidence_score': RULE_MATCH_SCORE,
+        'reasoning': 'Rule-based exact match on ' + ', '.join(key_factors),
+        'key_factors': key_factors,
+        'red_flags': [],
+        'match_quality': 'excellent',
+        'scoring_method': 'rule'
+    }
+
+# --- Gemini Client Registry ---
+
+def _create_gemini_model(model_name: str, generation_config: Dict = None, system_instruction: str = None,
+                         cached_content=None):
+    """Default model factory: a real Gemini model, bound to cached content when one is given."""
+    if cached_content is not None:
+        return genai.GenerativeModel.from_cached_content(cached_content, generation_config=generation_config)
+    return genai.GenerativeModel(model_name, generation_config=generation_config,
+                                 system_instruction=system_instruction)
+
+def _create_gemini_cached_content(model_name: str, system_instruction: str, ttl: float):
+    """Default cache factory: upload the instructions as a server-side cached content handle."""
+    return genai.caching.CachedContent.create(
+        model=model_name, system_instruction=system_instruction, ttl=timedelta(seconds=ttl)
+    )
+
+class GeminiClientRegistry:
+    """
+    Process-wide Gemini client setup.
+    Configures the SDK once, caches one model handle per (model name, generation config,
+    system instruction) and routes every call through generate_content(), which applies
+    the request timeout and records call metrics. Static instructions are attached as a
+    cached content handle when context caching is enabled (recreated before it expires),
+    or as the model's system instruction otherwise. Safe to share between threads.
+    The model and cache factories can be replaced, e.g. with a local stand-in model.
+    """
+    
+    def __init__(self, request_timeout: float = GEMINI_REQUEST_TIMEOUT, model_factory=None, cache_factory=None,
+                 context_cache_enabled: bool = GEMINI_CONTEXT_CACHE_ENABLED,
+                 context_cache_ttl: float = GEMINI_CONTEXT_CACHE_TTL):
+        """Create an unconfigured registry; configure() sets the API key."""
+        self.request_timeout = request_timeout
+        self.model_factory = model_factory or _create_gemini_model
+        self.cache_factory = cache_factory or _create_gemini_cached_content
+        self.context_cache_enabled = context_cache_enabled
+        self.context_cache_ttl = context_cache_ttl
+        self.available = False
+        self.calls = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.context_cache_refreshes = 0
+        self.context_cache_failures = 0
+        self._api_key = None
+        self._models = {}
+        self._context_caches = {}  # model key -> (model, expires_at)
+        self._context_caches_creating = set()  # model keys whose cached content is being created
+        self._context_cache_retry_at = 0.0
+        self._lock = threading.Lock()
+    
+    def configure(self, api_key: str = None) -> bool:
+        """
+        Configure the Gemini SDK (only when the key changes).
+        
+        Args:
+            api_key: Key to use; defaults to GEMINI_API_KEY
+            
+        Returns:
+            True if Gemini is available
+        """
+        api_key = (api_key or GEMINI_API_KEY or '').strip()
+        if not api_key or api_key == "your-gemini-api-key-here":
+            return self.available
+        
+        with self._lock:
+            if api_key != self._api_key:
+                genai.configure(api_key=api_key)
+                self._api_key = api_key
+                self._models.clear()
+                self._context_caches.clear()
+                self.available = True
+                print("✅ AI confidence scoring enabled with Google Gemini")
+        return True
+    
+    @staticmethod
+    def _model_key(model_name: str, generation_config: Dict, system_instruction: str) -> tuple:
+        """Hashable cache key for a model configuration."""
+        return (
+            model_name,
+            json.dumps(generation_config, sort_keys=True, default=str) if generation_config else None,
+            system_instruction
+        )
+    
+    def get_model(self, model_name: str = GEMINI_MODEL_NAME, generation_config: Dict = None,
+                  system_instruction: str = None):
+        """
+        Return the cached model handle for this configuration.
+        With a system instruction and context caching enabled, the instruction is served
+        from a cached content handle that is recreated shortly before it expires; if the
+        cache can't be created the instruction is sent as a plain system instruction.
+        """
+        key = self._model_key(model_name, generation_config, system_instruction)
+        
+        if system_instruction and self.context_cache_enabled:
+            model = self._get_context_cached_model(key, model_name, generation_config, system_instruction)
+            if model is not None:
+                return model
+        
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self.model_factory(model_name, generation_config, system_instruction)
+                self._models[key] = model
+            return model
+    
+    def _get_context_cached_model(self, key: tuple, model_name: str, generation_config: Dict,
+                                  system_instruction: str):
+        """
+        Return a model bound to live cached content for the instruction, or None to fall back.
+        The cached content is created outside the lock (it is a network call); while one thread
+        creates it, others keep using the current handle until it expires, then the fallback.
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._context_caches.get(key)
+            if entry is not None and now < entry[1] - GEMINI_CONTEXT_CACHE_REFRESH_MARGIN:
+                return entry[0]
+            if key in self._context_caches_creating:
+                return entry[0] if entry is not None and now < entry[1] else None
+            if now < self._context_cache_retry_at:
+                return None
+            self._context_caches_creating.add(key)
+        
+        try:
+            cached_content = self.cache_factory(model_name, system_instruction, self.context_cache_ttl)
+            model = self.model_factory(model_name, generation_config, None, cached_content)
+        except Exception as e:
+            with self._lock:
+                # Retry creation after a full TTL rather than on every call
+                self.context_cache_failures += 1
+                self._context_cache_retry_at = time.time() + self.context_cache_ttl
+                self._context_caches_creating.discard(key)
+            logger.warning(f"⚠️  Gemini context cache unavailable, using system instruction: {e}")
+            return None
+        
+        with self._lock:
+            self._context_caches[key] = (model, now + self.context_cache_ttl)
+            self._context_caches_creating.discard(key)
+            self.context_cache_refreshes += 1
+        return model
+    
+    def invalidate_context_cache(self, model_name: str = GEMINI_MODEL_NAME, generation_config: Dict = None,
+                                 system_instruction: str = None):
+        """Drop a cached content handle so the next call creates a fresh one."""
+        with self._lock:
+            self._context_caches.pop(self._model_key(model_name, generation_config, system_instruction), None)
+    
+    def generate_content(self, prompt: str, model_name: str = GEMINI_MODEL_NAME, generation_config: Dict = None,
+                         system_instruction: str = None):
+        """
+        Call the cached model with the registry's timeout, recording latency and failures.
+        A call that fails because its cached content expired early is retried once on a fresh handle.
+        """
+        start_time = time.time()
+        try:
+            model = self.get_model(model_name, generation_config, system_instruction)
+            try:
+                response = model.generate_content(prompt, request_options={'timeout': self.request_timeout})
+            except Exception as e:
+                key = self._model_key(model_name, generation_config, system_instruction)
+                with self._lock:
+                    context_cached = key in self._context_caches
+                if not context_cached or 'cache' not in str(e).lower():
+                    raise
+                logger.info(f"♻️  Gemini context cache expired, refreshing: {e}")
+                self.invalidate_context_cache(model_name, generation_config, system_instruction)
+                model = self.get_model(model_name, generation_config, system_instruction)
+                response = model.generate_content(prompt, request_options={'timeout': self.request_timeout})
+            
+            usage = gemini_token_usage(response)
+            with self._lock:
+                self.prompt_tokens += usage['prompt_tokens']
+                self.response_tokens += usage['response_tokens']
+            return response
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.total_latency += time.time() - start_time
+    
+    def warm(self) -> bool:
+        """Configure the SDK and build the batch scoring model ahead of the first request."""
+        if not self.configure():
+            print("⚠️  Gemini not configured (GEMINI_API_KEY missing); skipping model warm-up")
+            return False
+        self.get_model(GEMINI_MODEL_NAME, BATCH_GENERATION_CONFIG, SCORING_RUBRIC)
+        return True
+    
+    def stats(self) -> Dict:
+        """Return availability, cached model count and call metrics."""
+        with self._lock:
+            return {
+                'available': self.available,
+                'cached_models': len(self._models),
+                'context_caches': len(self._context_caches),
+                'context_cache_refreshes': self.context_cache_refreshes,
+                'context_cache_failures': self.context_cache_failures,
+                'calls': self.calls,
+                'failures': self.failures,
+                'average_latency': round(self.total_latency / self.calls, 3) if self.calls else 0,
+                'prompt_tokens': self.prompt_tokens,
+                'response_tokens': self.response_tokens,
+                'request_timeout': self.request_timeout
+            }
+
+def gemini_token_usage(response) -> Dict:
+    """Read prompt/response token counts from a Gemini response (zeros when not reported)."""
+    usage = getattr(response, 'usage_metadata', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_token_count', 0) or 0,
+        'response_tokens': getattr(usage, 'candidates_token_count', 0) or 0
+    }
+
+def _collect_token_usage(scored_listings: Iterable[Dict], totals: Dict):
+    """
+    Move the per-call token shares off freshly scored listings into totals, so they
+    are never cached, snapshotted or counted again when the listing is reused.
+    """
+    for listing in scored_listings:
+        usage = listing.get('confidence_analysis', {}).pop('token_usage', None)
+        for key, count in (usage or {}).items():
+            totals[key] = totals.get(key, 0) + count
+
+_gemini_registry = None
+_gemini_registry_lock = threading.Lock()
+
+def get_gemini_registry() -> GeminiClientRegistry:
+    """Return the shared process-wide Gemini client registry, creating it on first use."""
+    global _gemini_registry
+    if _gemini_registry is None:
+        with _gemini_registry_lock:
+            if _gemini_registry is None:
+                _gemini_registry = GeminiClientRegistry()
+    return _gemini_registry
 
 # --- AI Confidence Scoring System ---
 
+# JSON schema the batch scoring response is constrained to
+BATCH_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'results': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'listing_index': {'type': 'integer'},
+                    'confidence_score': {'type': 'integer'},
+                    'reasoning': {'type': 'string'},
+                    'key_factors': {'type': 'array', 'items': {'type': 'string'}},
+                    'red_flags': {'type': 'array', 'items': {'type': 'string'}},
+                    'match_quality': {'type': 'string', 'enum': ['excellent', 'good', 'fair', 'poor']}
+                },
+                'required': ['listing_index', 'confidence_score', 'reasoning']
+            }
+        }
+    },
+    'required': ['results']
+}
+
+# Static scoring instructions, sent once as the model's system instruction (or cached content)
+SCORING_RUBRIC = """
+You are an expert coin collector and eBay listing analyzer. You score eBay listings for how well
+they match a search query.
+
+For each listing provide:
+1. A confidence score from 0-100 (where 100 = perfect match, 0 = completely wrong)
+2. Brief reasoning for the score (keep under 50 words)
+3. Key factors that influenced your decision
+
+Consider:
+- Does it match the year specified in the search query?
+- Does it match the coin type (Silver Eagle, Gold Eagle, etc.)?
+- Does it match any specified grade (MS69, MS70, PR70, etc.)?
+- Is it the actual coin or just accessories/boxes?
+- Is it the right condition/type?
+- Are there any red flags (wrong coin, damaged, etc.)?
+
+Respond in JSON with one result per listing. listing_index is the number after LISTING:
+{
+  "results": [
+    {"listing_index": 0, "confidence_score": 85, "reasoning": "Perfect match for year and grade",
+      "key_factors": ["2004 year matches", "MS69 grade matches"], "red_flags": [], "match_quality": "excellent"},
+    {"listing_index": 1, "confidence_score": 20, "reasoning": "Wrong coin type",
+      "key_factors": ["Gold Eagle, not Silver Eagle"], "red_flags": ["Wrong coin"], "match_quality": "poor"}
+  ]
+}
+""".strip()
+
+BATCH_GENERATION_CONFIG = {'response_mime_type': 'application/json', 'response_schema': BATCH_RESPONSE_SCHEMA}
+
+def _validate_batch_entry(entry, listing_count: int):
+    """
+    Validate one entry of a batch scoring response.
+    
+    Returns:
+        (listing_index, confidence_analysis) for a usable entry, or None if it is malformed
+    """
+    if not isinstance(entry, dict):
+        return None
+    
+    listing_index = entry.get('listing_index')
+    confidence_score = entry.get('confidence_score')
+    if isinstance(listing_index, bool) or not isinstance(listing_index, int) \
+            or not 0 <= listing_index < listing_count:
+        return None
+    if isinstance(confidence_score, bool) or not isinstance(confidence_score, (int, float)) \
+            or not 0 <= confidence_score <= 100:
+        return None
+    
+    key_factors = entry.get('key_factors')
+    red_flags = entry.get('red_flags')
+    return listing_index, {
+        'confidence_score': confidence_score,
+        'reasoning': str(entry.get('reasoning') or 'No reasoning provided'),
+        'key_factors': key_factors if isinstance(key_factors, list) else [],
+        'red_flags': red_flags if isinstance(red_flags, list) else [],
+        'match_quality': entry.get('match_quality', 'unknown'),
+        'scoring_method': 'ai'
+    }
+
+def _parse_json_response(text: str):
+    """Parse a model's JSON reply, tolerating a surrounding markdown code fence."""
+    text = (text or '').strip()
+    fenced = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    return json.loads(text)
+
+def _batch_listing_line(index: int, listing: Dict, search_query: str = None) -> str:
+    """Format one listing for a batch prompt; the query is included when prompts mix queries."""
+    title = normalize_listing_title(listing.get('title', ''))
+    price = listing.get('soldPrice', 'N/A')
+    if search_query is None:
+        return f"LISTING {index}: Title='{title}', Price={price}"
+    return f"LISTING {index}: Query='{search_query}', Title='{title}', Price={price}"
+
+def max_batch_listings() -> int:
+    """Most listings one batch may hold before its response risks exceeding the output budget."""
+    return max(1, min(AI_BATCH_SIZE, AI_BATCH_OUTPUT_TOKEN_BUDGET // AI_RESULT_TOKEN_ESTIMATE))
+
+def _iter_listing_batches(listings: Iterable[Dict], token_budget: int = AI_BATCH_INPUT_TOKEN_BUDGET):
+    """
+    Group a list or stream of listings into batches, skipping None entries.
+    Each batch is closed once its listing lines would exceed token_budget or
+    it reaches max_batch_listings(), so short titles pack into fewer requests.
+    """
+    max_listings = max_batch_listings()
+    batch = []
+    batch_tokens = 0
+    for listing in listings:
+        if listing is None:
+            continue
+        tokens = _estimate_tokens(_batch_listing_line(len(batch), listing))
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_listings):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(listing)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
 class eBayConfidenceScorer:
     """
     AI-powered system to score how well eBay listings match search criteria.
     Uses Gemini's GPT models to analyze listing titles and determine relevance.
     """
     
-    def __init__(self, api_key: str = None):
-        """Initialize the confidence scorer with Google Gemini API key."""
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.use_ai = True
-            print("✅ AI confidence scoring enabled with Google Gemini")
-        elif GEMINI_API_KEY and GEMINI_API_KEY != "your-gemini-api-key-here" and GEMINI_API_KEY.strip():
-            genai.configure(api_key=GEMINI_API_KEY)
-            self.use_ai = True
-            print("✅ AI confidence scoring enabled with Google Gemini")
-        else:
+    def __init__(self, api_key: str = None, score_cache: ListingScoreCache = None,
+                 scheduler: 'CrossQueryScoringScheduler' = None, gemini: GeminiClientRegistry = None,
+                 use_score_cache: bool = True):
+        """
+        Initialize the confidence scorer with Google Gemini API key.
+        A score cache (the shared one unless given) skips listings already scored for the
+        query; use_score_cache=False scores every listing. An optional scheduler packs
+        uncached listings into prompts shared with other queries.
+        Gemini models come from the shared client registry unless one is given.
+        """
+        if not use_score_cache:
+            score_cache = None
+        elif score_cache is None and SCORE_CACHE_ENABLED:
+            score_cache = get_score_cache()
+        self.score_cache = score_cache
+        self.scheduler = scheduler
+        self.gemini = gemini or get_gemini_registry()
+        
+        self.use_ai = self.gemini.configure(api_key)
+        if not self.use_ai:
             print("⚠️  Warning: No Gemini API key provided. Using rule-based scoring only.")
-            self.use_ai = False
     
     def score_listing_confidence(self, listing: Dict, search_query: str) -> Dict:
         """
@@ -80,18 +1641,18 @@ class eBayConfidenceScorer:
             
         Returns:
             Dictionary with confidence score and reasoning
-        """
-        title = listing.get('title', '')
-        price = listing.get('soldPrice', 'N/A')
-        
-        if not self.use_ai:
-            raise Exception("AI scoring is required but not available")
+        """
+        scored_listing = self._score_items([(listing, search_query)])[0]
+        if scored_listing is None:
+            raise Exception(f"AI scoring failed for listing '{listing.get('title', '')}'")
         
-        return self._ai_score_listing(title, price, search_query)
+        return scored_listing['confidence_analysis']
     
     def score_listings_batch(self, listings: List[Dict], search_query: str) -> List[Dict]:
         """
         Score multiple listings in a single API call for better performance.
+        Listings already scored for this query under the same title are served from
+        the score cache and only new or retitled listings are sent to the AI.
         
         Args:
             listings: List of listing dictionaries
@@ -100,255 +1661,318 @@ class eBayConfidenceScorer:
         Returns:
             List of dictionaries with confidence scores
         """
-        if not self.use_ai:
-            raise Exception("AI scoring is required but not available")
-        
         if not listings:
             return []
         
-        # Create batch prompt
-        batch_data = []
-        for i, listing in enumerate(listings):
-            title = listing.get('title', '')
-            price = listing.get('soldPrice', 'N/A')
-            batch_data.append(f"LISTING {i+1}: Title='{title}', Price={price}")
+        if self.score_cache is None:
+            return self._score_uncached_batch(listings, search_query)
         
-        batch_text = "\n".join(batch_data)
+        cached_scores = self.score_cache.get_many(search_query, listings)
         
-        prompt = f"""
-You are an expert coin collector and eBay listing analyzer. Score multiple listings for relevance to a search query.
-
-SEARCH QUERY: "{search_query}"
-
-LISTINGS TO ANALYZE:
-{batch_text}
-
-Analyze the listing and provide:
-1. A confidence score from 0-100 (where 100 = perfect match, 0 = completely wrong)
-2. Brief reasoning for the score (keep under 50 words)
-3. Key factors that influenced your decision
-
-Consider:
-- Does it match the year specified in the search query?
-- Does it match the coin type (Silver Eagle, Gold Eagle, etc.)?
-- Does it match any specified grade (MS69, MS70, PR70, etc.)?
-- Is it the actual coin or just accessories/boxes?
-- Is it the right condition/type?
-- Are there any red flags (wrong coin, damaged, etc.)?
-
-Respond in JSON format with an array of results:
-{{
-  "results": [
-    {{"listing_index": 0, "confidence_score": 85, "reasoning": "Perfect match for year and grade"}},
-    {{"listing_index": 1, "confidence_score": 20, "reasoning": "Wrong coin type"}}
-  ]
-}}
-"""
+        cached_listings = []
+        pending_listings = []
+        for listing in listings:
+            cached = cached_scores.get(listing.get('itemId'))
+            if cached is not None:
+                cached_listing = listing.copy()
+                cached_listing['confidence_analysis'] = dict(cached, cached=True)
+                cached_listings.append(cached_listing)
+            else:
+                pending_listings.append(listing)
         
-        try:
-            # Simple rate limiting
-            global _last_api_call
-            current_time = time.time()
-            time_since_last = current_time - _last_api_call
-            if time_since_last < _api_call_interval:
-                time.sleep(_api_call_interval - time_since_last)
-            
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            # Remove timeout parameter as it's not supported
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
-            _last_api_call = time.time()
-            
-            # Add delay after AI API call to prevent rate limiting
-            time.sleep(0.5)  # Reduced from 1 to 0.5 seconds after AI API call
-            
-            # Parse JSON response
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3]
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3]
-            
-            result_data = json.loads(response_text)
-            
-            # Map results back to listings
-            scored_listings = []
-            for result in result_data.get('results', []):
-                listing_index = result.get('listing_index', 0)
-                if listing_index < len(listings):
-                    listing = listings[listing_index].copy()
-                    listing['confidence_analysis'] = {
-                        'confidence_score': result.get('confidence_score', 0),
-                        'reasoning': result.get('reasoning', 'No reasoning provided'),
-                        'key_factors': result.get('reasoning', 'No factors identified')
-                    }
-                    scored_listings.append(listing)
-            
-            return scored_listings
-            
-        except Exception as e:
-            print(f"⚠️  Batch scoring failed, falling back to individual scoring: {e}")
-            print(f"Error type: {type(e).__name__}")
-            print(f"Error details: {str(e)}")
-            print(f"Response text (if any): {response_text if 'response_text' in locals() else 'No response'}")
-            # Fallback to individual scoring with retry
-            scored_listings = []
-            for listing in listings:
-                try:
-                    result = self.score_listing_confidence(listing, search_query)
-                    scored_listings.append(result)
-                except Exception as e:
-                    print(f"⚠️  Failed to score listing: {e}")
-                    print(f"Listing title: {listing.get('title', 'Unknown')}")
-                    continue
-            return scored_listings
+        if cached_listings:
+            print(f"💾 Score cache: {len(cached_listings)} cached, {len(pending_listings)} to score")
+        
+        if not pending_listings:
+            return cached_listings
+        
+        scored_listings = self._score_uncached_batch(pending_listings, search_query)
+        
+        self.score_cache.put_many(search_query, scored_listings)
+        
+        return cached_listings + scored_listings
     
-    def _ai_score_listing(self, title: str, price: str, search_query: str) -> Dict:
-        """Use Google Gemini to score listing confidence."""
-        prompt = f"""
-You are an expert coin collector and eBay listing analyzer. Your task is to determine how well an eBay listing matches a search query.
-
-SEARCH QUERY: "{search_query}"
-LISTING TITLE: "{title}"
-PRICE: {price}
-
-Analyze the listing and provide:
-1. A confidence score from 0-100 (where 100 = perfect match, 0 = completely wrong)
-2. Brief reasoning for the score (keep under 50 words)
-3. Key factors that influenced your decision
-
-Consider:
-- Does it match the year specified in the search query?
-- Does it match the coin type (Silver Eagle, Gold Eagle, etc.)?
-- Does it match any specified grade (MS69, MS70, PR70, etc.)?
-- Is it the actual coin or just accessories/boxes?
-- Is it the right condition/type?
-- Are there any red flags (wrong coin, damaged, etc.)?
-
-Respond in JSON format:
-{{
-    "confidence_score": 85,
-    "reasoning": "Strong match - correct year, coin type, and grade",
-    "key_factors": ["2004 year matches", "Silver Eagle type matches", "MS69 grade specified"],
-    "red_flags": ["None"],
-    "match_quality": "excellent"
-}}
-"""
+    def _score_uncached_batch(self, listings: List[Dict], search_query: str) -> List[Dict]:
+        """Score listings with a single Gemini batch request (no cache lookup)."""
+        if self.scheduler is not None:
+            return self.scheduler.score(listings, search_query)
+        scored = self._score_items([(listing, search_query) for listing in listings])
+        return [listing for listing in scored if listing is not None]
+    
+    def _build_batch_prompt(self, items: List[tuple]) -> str:
+        """
+        Build the per-call part of the batch scoring prompt for (listing, search_query) pairs;
+        the static rubric is supplied separately as SCORING_RUBRIC.
+        When every listing shares one query the query is stated once; otherwise each
+        listing is tagged with its own query so searches can share a prompt.
+        """
+        queries = {search_query for _, search_query in items}
+        
+        batch_text = "\n".join(
+            _batch_listing_line(i, listing, search_query if len(queries) > 1 else None)
+            for i, (listing, search_query) in enumerate(items)
+        )
+        
+        if len(queries) == 1:
+            header = f'SEARCH QUERY: "{next(iter(queries))}"'
+        else:
+            header = (
+                "Each listing is tagged with its own search query (Query=...). "
+                "Score every listing only against its own query."
+            )
+        
+        return f"{header}\n\nLISTINGS TO ANALYZE:\n{batch_text}"
+    
+    def _score_items(self, items: List[tuple]) -> List[Dict]:
+        """
+        Score (listing, search_query) pairs in a single Gemini request.
+        Every valid entry of the response is kept. Listings missing from a partial response
+        are re-requested together, and a batch that fails outright is split in halves that
+        are retried concurrently, so one poisonous title is isolated in about log2(N) calls.
+        The same model and rubric are used at every level.
         
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
+        Args:
+            items: (listing, search_query) pairs; queries may differ when packed across searches
+            
+        Returns:
+            List aligned with items: a scored copy of each listing, or None if it wasn't scored.
+            Each confidence_analysis records the retries the listing needed.
+        """
+        if not self.use_ai:
+            raise Exception("AI scoring is required but not available")
         
-        if not response or not response.text:
-            raise Exception("AI API returned empty response")
+        analyses = self._score_with_bisection(items, 0)
         
-        # Add delay after AI API call to prevent rate limiting
-        time.sleep(0.5)  # Reduced from 1 to 0.5 seconds after AI API call
+        scored_listings = [None] * len(items)
+        for index, analysis in analyses.items():
+            listing = items[index][0].copy()
+            listing['confidence_analysis'] = analysis
+            scored_listings[index] = listing
+        return scored_listings
+    
+    def _score_with_bisection(self, items: List[tuple], retries: int) -> Dict[int, Dict]:
+        """
+        Score items, retrying whatever is left unscored on smaller sub-batches.
+        Throttled requests (429/timeout) are retried whole after a backoff instead,
+        since splitting them would only multiply calls against an exhausted quota.
         
-        # Parse the response
-        text = response.text.strip()
+        Returns:
+            Mapping of index into items -> confidence_analysis for every listing scored
+        """
+        # Throttle waits have their own budget per request; retries counts bisection/re-request rounds
+        throttle_retries = 0
+        while True:
+            try:
+                analyses = self._request_batch_scores(items)
+            except Exception as e:
+                if _is_throttling_error(e):
+                    batch_concurrency.record_throttle('gemini', type(e).__name__)
+                    if throttle_retries >= AI_THROTTLE_MAX_RETRIES:
+                        print(f"⚠️  Gemini still throttled after {throttle_retries} retries; "
+                              f"giving up on {len(items)} listings")
+                        return {}
+                    delay = AI_THROTTLE_BACKOFF * 2 ** throttle_retries
+                    print(f"🐢 Gemini throttled ({type(e).__name__}); retrying {len(items)} listings in {delay:.0f}s")
+                    time.sleep(delay)
+                    throttle_retries += 1
+                    continue
+                print(f"⚠️  Batch scoring request failed ({len(items)} listings): {type(e).__name__}: {e}")
+                analyses = {}
+            break
         
-        # Remove any markdown formatting
-        text = text.replace('```json', '').replace('```', '').strip()
+        for analysis in analyses.values():
+            analysis['retries'] = retries
         
-        if not text:
-            raise Exception("AI response is empty after cleaning")
+        missing = [i for i in range(len(items)) if i not in analyses]
+        if not missing:
+            return analyses
         
-        result = json.loads(text)
+        if retries >= AI_BATCH_MAX_RETRIES or len(items) == 1:
+            for i in missing:
+                print(f"⚠️  Giving up on listing after {retries} retries: {items[i][0].get('title', 'Unknown')}")
+            return analyses
         
-        if 'confidence_score' not in result:
-            raise Exception("AI response missing confidence_score")
+        if analyses:
+            # Partial response: re-request only the missing listings
+            groups = [missing]
+        else:
+            middle = len(missing) // 2
+            groups = [missing[:middle], missing[middle:]]
+            print(f"✂️  Splitting failed batch of {len(items)} into {len(groups[0])} + {len(groups[1])}")
         
-        # Ensure confidence score is between 0-100
-        confidence_score = max(0, min(100, result.get('confidence_score', 50)))
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            group_results = executor.map(
+                lambda group: self._score_with_bisection([items[i] for i in group], retries + 1), groups
+            )
+            for group, group_analyses in zip(groups, group_results):
+                for local_index, analysis in group_analyses.items():
+                    analyses[group[local_index]] = analysis
         
-        return {
-            'confidence_score': confidence_score,
-            'reasoning': result.get('reasoning', 'AI analysis completed'),
-            'key_factors': result.get('key_factors', []),
-            'red_flags': result.get('red_flags', []),
-            'match_quality': result.get('match_quality', 'unknown'),
-            'ai_analyzed': True
-        }
+        return analyses
     
-
+    def _request_batch_scores(self, items: List[tuple]) -> Dict[int, Dict]:
+        """
+        Send one schema-constrained batch request.
+        
+        Returns:
+            Mapping of index into items -> confidence_analysis for every valid entry
+        """
+        prompt = self._build_batch_prompt(items)
+        
+        gemini_rate_limiter.acquire()
+        
+        response = self.gemini.generate_content(prompt, GEMINI_MODEL_NAME, BATCH_GENERATION_CONFIG, SCORING_RUBRIC)
+        usage = gemini_token_usage(response)
+        result_data = _parse_json_response(response.text)
+        entries = result_data.get('results', []) if isinstance(result_data, dict) else []
+        
+        analyses = {}
+        invalid = 0
+        for entry in entries:
+            validated = _validate_batch_entry(entry, len(items))
+            if validated is None:
+                invalid += 1
+            elif validated[0] not in analyses:
+                analyses[validated[0]] = validated[1]
+        
+        # Each scored listing carries its share of this call's tokens, so summing over listings counts the call once
+        for analysis in analyses.values():
+            analysis['token_usage'] = {key: count / len(analyses) for key, count in usage.items()}
+        
+        if invalid:
+            print(f"⚠️  Discarded {invalid} invalid entries from batch response")
+        return analyses
     
-    def analyze_listings(self, listings: List[Dict], search_query: str, min_confidence: int = 30) -> Dict:
+    def analyze_listings(self, listings: Iterable[Dict], search_query: str, min_confidence: int = 30) -> Dict:
         """
         Analyze a list of listings and return confidence scores.
         Optimized with batch processing for better performance.
         
         Args:
-            listings: List of listing dictionaries
+            listings: List (or generator) of listing dictionaries; batches are scored
+                as soon as enough listings have arrived
             search_query: Original search query
             min_confidence: Minimum confidence score to include (0-100)
             
         Returns:
             Dictionary with analysis results
         """
-        print(f"\n🤖 Analyzing {len(listings)} listings for confidence scores...")
+        print(f"\n🤖 Analyzing listings for confidence scores...")
         print(f"Search Query: '{search_query}'")
         print(f"Minimum Confidence: {min_confidence}%")
         
-        # Filter out None listings first
-        valid_listings = [listing for listing in listings if listing is not None]
-        
-        if not valid_listings:
-            return {
-                'search_query': search_query,
-                'total_listings_analyzed': 0,
-                'listings_above_threshold': 0,
-                'high_confidence_listings': 0,
-                'average_confidence': 0,
-                'min_confidence': 0,
-                'max_confidence': 0,
-                'scored_listings': [],
-                'analysis_timestamp': datetime.now().isoformat()
-            }
-        
         scored_listings = []
-        high_confidence_count = 0
+        rule_scored = []
+        total_analyzed = 0
+        token_usage = {}
         
-        # Process listings in batches for better performance
-        batch_size = AI_BATCH_SIZE
-        for i in range(0, len(valid_listings), batch_size):
-            batch = valid_listings[i:i + batch_size]
-            print(f"📦 Processing batch {i//batch_size + 1}/{(len(valid_listings) + batch_size - 1)//batch_size}")
+        # Dispatch batches concurrently as they arrive; the Gemini rate limiter paces the actual calls
+        with ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENT_BATCHES) as executor:
+            futures = []
+            ambiguous_listings = self._split_rule_decisions(listings, search_query, rule_scored)
+            for batch_number, batch in enumerate(_iter_listing_batches(ambiguous_listings), 1):
+                total_analyzed += len(batch)
+                print(f"📦 Dispatching batch {batch_number} ({len(batch)} listings)")
+                futures.append(executor.submit(self.score_listings_batch, batch, search_query))
             
-            try:
-                # Use batch scoring for better performance
-                batch_results = self.score_listings_batch(batch, search_query)
-                
-                for listing in batch_results:
+            for future in as_completed(futures):
+                try:
+                    batch_result = future.result()
+                except Exception as e:
+                    print(f"⚠️  Batch processing failed: {e}")
+                    continue
+                _collect_token_usage(batch_result, token_usage)
+                for listing in batch_result:
                     if listing.get('confidence_analysis', {}).get('confidence_score', 0) >= min_confidence:
                         scored_listings.append(listing)
-                        if listing['confidence_analysis']['confidence_score'] >= 80:
-                            high_confidence_count += 1
-                            
-            except Exception as e:
-                print(f"⚠️  Batch processing failed, falling back to individual scoring: {e}")
-                print(f"Error type: {type(e).__name__}")
-                print(f"Error details: {str(e)}")
-                # Fallback to individual scoring for this batch
-                with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
-                    future_to_listing = {
-                        executor.submit(self.score_listing_confidence, listing, search_query): listing 
-                        for listing in batch
-                    }
-                    
-                    for future in as_completed(future_to_listing):
-                        listing = future_to_listing[future]
-                        try:
-                            confidence_data = future.result()
-                            if confidence_data is not None:
-                                listing['confidence_analysis'] = confidence_data
-                                if confidence_data['confidence_score'] >= min_confidence:
-                                    scored_listings.append(listing)
-                                    if confidence_data['confidence_score'] >= 80:
-                                        high_confidence_count += 1
-                        except Exception as e:
-                            print(f"⚠️  Error processing listing: {e}")
-                            print(f"Listing title: {listing.get('title', 'Unknown')}")
-                            continue
         
+        total_analyzed += len(rule_scored)
+        scored_listings.extend(self._filter_rule_decisions(rule_scored, min_confidence))
+        return self._summarize_analysis(search_query, total_analyzed, scored_listings, token_usage)
+    
+    def _split_rule_decisions(self, listings: Iterable[Dict], search_query: str, rule_scored: List[Dict]):
+        """
+        Yield the listings that still need the AI.
+        Listings the rule engine can decide on its own are scored in place and
+        appended to rule_scored instead, so they never reach Gemini.
+        """
+        query_attributes = parse_coin_attributes(search_query) if RULE_ENGINE_ENABLED else None
+        for listing in listings:
+            if listing is None:
+                continue
+            decision = rule_based_confidence(query_attributes, listing.get('title', '')) if query_attributes else None
+            if decision is None:
+                yield listing
+                continue
+            scored_listing = listing.copy()
+            scored_listing['confidence_analysis'] = decision
+            rule_scored.append(scored_listing)
+    
+    @staticmethod
+    def _filter_rule_decisions(rule_scored: List[Dict], min_confidence: int) -> List[Dict]:
+        """Report rule-engine decisions and keep the ones above the confidence threshold."""
+        if rule_scored:
+            matches = sum(1 for listing in rule_scored
+                          if listing['confidence_analysis']['confidence_score'] >= RULE_MATCH_SCORE)
+            print(f"📏 Rule engine decided {len(rule_scored)} listings without AI "
+                  f"({matches} exact matches, {len(rule_scored) - matches} rejected)")
+        return [listing for listing in rule_scored
+                if listing['confidence_analysis']['confidence_score'] >= min_confidence]
+    
+    async def score_listings_batch_async(self, listings: List[Dict], search_query: str) -> List[Dict]:
+        """
+        Async variant of score_listings_batch.
+        The blocking Gemini client runs in a worker thread while the event loop keeps
+        other batches and queries moving; in-flight calls are bounded per event loop.
+        """
+        async with _async_semaphore('gemini'):
+            return await asyncio.to_thread(self.score_listings_batch, listings, search_query)
+    
+    async def analyze_listings_async(self, listings: List[Dict], search_query: str, min_confidence: int = 30) -> Dict:
+        """
+        Async variant of analyze_listings that scores all batches concurrently.
+        
+        Args:
+            listings: List of listing dictionaries
+            search_query: Original search query
+            min_confidence: Minimum confidence score to include (0-100)
+            
+        Returns:
+            Dictionary with analysis results
+        """
+        print(f"\n🤖 Analyzing {len(listings)} listings for confidence scores (async)...")
+        
+        rule_scored = []
+        valid_listings = list(self._split_rule_decisions(listings, search_query, rule_scored))
+        rule_matches = self._filter_rule_decisions(rule_scored, min_confidence)
+        
+        if not valid_listings:
+            return self._summarize_analysis(search_query, len(rule_scored), rule_matches)
+        
+        batches = list(_iter_listing_batches(valid_listings))
+        batch_results = await asyncio.gather(
+            *(self.score_listings_batch_async(batch, search_query) for batch in batches),
+            return_exceptions=True
+        )
+        
+        scored_listings = rule_matches
+        token_usage = {}
+        for result in batch_results:
+            if isinstance(result, Exception):
+                print(f"⚠️  Batch processing failed: {result}")
+                continue
+            _collect_token_usage(result, token_usage)
+            for listing in result:
+                if listing.get('confidence_analysis', {}).get('confidence_score', 0) >= min_confidence:
+                    scored_listings.append(listing)
+        
+        return self._summarize_analysis(
+            search_query, len(valid_listings) + len(rule_scored), scored_listings, token_usage
+        )
+    
+    def _summarize_analysis(self, search_query: str, total_analyzed: int, scored_listings: List[Dict],
+                            token_usage: Dict = None) -> Dict:
+        """Sort scored listings and calculate confidence statistics (token_usage: Gemini tokens spent)."""
         # Sort by confidence score (highest first)
         scored_listings.sort(key=lambda x: x['confidence_analysis']['confidence_score'], reverse=True)
         
@@ -357,145 +1981,618 @@ Respond in JSON format:
         
         analysis_results = {
             'search_query': search_query,
-            'total_listings_analyzed': len(valid_listings),
+            'total_listings_analyzed': total_analyzed,
             'listings_above_threshold': len(scored_listings),
-            'high_confidence_listings': high_confidence_count,
+            'high_confidence_listings': sum(1 for score in confidence_scores if score >= 80),
             'average_confidence': sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0,
             'min_confidence': min(confidence_scores) if confidence_scores else 0,
             'max_confidence': max(confidence_scores) if confidence_scores else 0,
+            'scoring_methods': {
+                method: sum(1 for listing in scored_listings
+                            if listing['confidence_analysis'].get('scoring_method', 'ai') == method)
+                for method in ('rule', 'ai')
+            },
             'scored_listings': scored_listings,
+            'token_usage': {
+                'prompt_tokens': round((token_usage or {}).get('prompt_tokens', 0)),
+                'response_tokens': round((token_usage or {}).get('response_tokens', 0))
+            },
             'analysis_timestamp': datetime.now().isoformat()
         }
         
         return analysis_results
 
+_confidence_scorer = None
+_confidence_scorer_lock = threading.Lock()
+
+def get_confidence_scorer() -> eBayConfidenceScorer:
+    """Return the shared scorer used by single-query analyses, creating it on first use."""
+    global _confidence_scorer
+    if _confidence_scorer is None:
+        with _confidence_scorer_lock:
+            if _confidence_scorer is None:
+                _confidence_scorer = eBayConfidenceScorer()
+    return _confidence_scorer
+
+# --- Cross-Query Prompt Packing ---
+
+class CrossQueryScoringScheduler:
+    """
+    Packs listings from many concurrent queries into shared Gemini prompts.
+    Each listing is tagged with its own search query; prompts are filled up to a token
+    budget (or sent after a short wait) and every score is routed back to the
+    analyze_listings call that submitted it. Use as a context manager around a batch run.
+    """
+    
+    def __init__(self, scorer: 'eBayConfidenceScorer' = None, token_budget: int = AI_BATCH_INPUT_TOKEN_BUDGET,
+                 max_listings: int = None, max_wait: float = PACKED_PROMPT_MAX_WAIT,
+                 max_workers: int = AI_MAX_CONCURRENT_BATCHES):
+        """Start the dispatcher thread; packed prompts are scored on a pool of max_workers."""
+        self.scorer = scorer or eBayConfidenceScorer(use_score_cache=False)
+        self.token_budget = token_budget
+        self.max_listings = max_listings or max_batch_listings()
+        self.max_wait = max_wait
+        self.prompts_sent = 0
+        self.listings_sent = 0
+        self.multi_query_prompts = 0
+        self._pending = []  # (listing, search_query, future, tokens, enqueued_at)
+        self._pending_tokens = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='prompt-packer', daemon=True)
+        self._dispatcher.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+    
+    def score(self, listings: List[Dict], search_query: str) -> List[Dict]:
+        """
+        Score listings through shared prompts and wait for their results.
+        
+        Returns:
+            Scored copies of the listings (listings the AI didn't score are omitted)
+        """
+        futures = [self.submit(listing, search_query) for listing in listings]
+        return [listing for listing in (future.result() for future in futures) if listing is not None]
+    
+    def submit(self, listing: Dict, search_query: str) -> Future:
+        """Queue one listing for scoring against its query."""
+        future = Future()
+        tokens = _estimate_tokens(_batch_listing_line(0, listing, search_query))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scoring scheduler is closed")
+            self._pending.append((listing, search_query, future, tokens, time.time()))
+            self._pending_tokens += tokens
+            self._cond.notify_all()
+        return future
+    
+    def close(self):
+        """Flush pending listings and stop the dispatcher."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+    
+    def _prompt_full_locked(self) -> bool:
+        """Whether pending listings already fill a prompt. Caller must hold the lock."""
+        return self._pending_tokens >= self.token_budget or len(self._pending) >= self.max_listings
+    
+    def _take_prompt_locked(self) -> List[tuple]:
+        """Pop one prompt's worth of pending listings (at least one). Caller must hold the lock."""
+        packed = []
+        tokens = 0
+        while self._pending and len(packed) < self.max_listings:
+            item_tokens = self._pending[0][3]
+            if packed and tokens + item_tokens > self.token_budget:
+                break
+            packed.append(self._pending.pop(0))
+            tokens += item_tokens
+        self._pending_tokens -= tokens
+        return packed
+    
+    def _dispatch_loop(self):
+        """Send packed prompts once they are full or the oldest listing has waited max_wait."""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                
+                deadline = self._pending[0][4] + self.max_wait
+                while not self._closed and not self._prompt_full_locked():
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                
+                packed = self._take_prompt_locked()
+            
+            self._executor.submit(self._score_packed, packed)
+    
+    def _score_packed(self, packed: List[tuple]):
+        """Score one packed prompt and resolve each listing's future."""
+        queries = {search_query for _, search_query, _, _, _ in packed}
+        with self._cond:
+            self.prompts_sent += 1
+            self.listings_sent += len(packed)
+            if len(queries) > 1:
+                self.multi_query_prompts += 1
+        print(f"📦 Packed prompt: {len(packed)} listings from {len(queries)} queries")
+        
+        try:
+            results = self.scorer._score_items([(listing, search_query) for listing, search_query, _, _, _ in packed])
+        except Exception as e:
+            for _, _, future, _, _ in packed:
+                future.set_exception(e)
+            return
+        
+        for (_, _, future, _, _), result in zip(packed, results):
+            future.set_result(result)
+    
+    def stats(self) -> Dict:
+        """Return packing counters."""
+        with self._cond:
+            return {
+                'prompts_sent': self.prompts_sent,
+                'listings_sent': self.listings_sent,
+                'multi_query_prompts': self.multi_query_prompts,
+                'avg_listings_per_prompt': round(self.listings_sent / self.prompts_sent, 1) if self.prompts_sent else 0,
+                'pending': len(self._pending)
+            }
+
 # --- eBay API Functions ---
 
+_ebay_session = None
+_ebay_session_lock = threading.Lock()
+
+def get_ebay_session() -> requests.Session:
+    """
+    Return the shared keep-alive session used for every eBay call, creating it on first use.
+    The underlying urllib3 connection pool is thread-safe, so one session serves all Flask
+    and batch worker threads and TCP+TLS handshakes are paid once per pooled connection.
+    """
+    global _ebay_session
+    if _ebay_session is None:
+        with _ebay_session_lock:
+            if _ebay_session is None:
+                # Only retry failed connects; reads and HTTP errors are handled by the caller
+                retry = Retry(
+                    total=EBAY_HTTP_CONNECT_RETRIES,
+                    connect=EBAY_HTTP_CONNECT_RETRIES,
+                    read=0,
+                    status=0,
+                    other=0,
+                    backoff_factor=EBAY_HTTP_RETRY_BACKOFF
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=EBAY_HTTP_POOL_SIZE,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'X-EBAY-C-MARKETPLACE-ID': 'EBAY-US',  # US marketplace
+                    'Content-Type': 'application/json',
+                    'Connection': 'keep-alive'
+                })
+                _ebay_session = session
+    return _ebay_session
+
+def _ebay_token_configured() -> bool:
+    """Check that an eBay OAuth token is available, printing setup help if not."""
+    if not EBAY_ACCESS_TOKEN or EBAY_ACCESS_TOKEN == 'YOUR_OAUTH_ACCESS_TOKEN':
+        print("❌ ERROR: EBAY_ACCESS_TOKEN not set or invalid")
+        print("   Please set EBAY_ACCESS_TOKEN environment variable on Render")
+        return False
+    return True
+
+def _parse_item_summaries(data: Dict) -> List[Dict]:
+    """Convert Browse API itemSummaries into our listing dictionaries."""
+    sold_items = []
+    # Parse the JSON response from Browse API
+    if data and 'itemSummaries' in data:
+        for item in data['itemSummaries']:
+            sold_item = {
+                'itemId': item.get('itemId', 'N/A'),
+                'title': item.get('title', 'N/A'),
+                'soldPrice': item.get('price', {}).get('value', 'N/A'),
+                'currency': item.get('price', {}).get('currency', 'N/A'),
+                'dateSold': 'N/A',  # Browse API doesn't provide sale date
+                'condition': item.get('condition', 'N/A'),
+                'itemLocation': item.get('itemLocation', {}).get('country', 'N/A'),
+                'shippingCost': item.get('shippingOptions', [{}])[0].get('shippingCost', {}).get('value', 'N/A') if item.get('shippingOptions') else 'N/A',
+                'totalPrice': 'N/A',  # Browse API doesn't provide total price
+                'buyingOptions': item.get('buyingOptions', []),
+                'listingType': 'N/A',  # Browse API doesn't provide listing type
+                'itemWebUrl': item.get('itemWebUrl', 'N/A'),
+                'seller': item.get('seller', {}).get('username', 'N/A'),
+            }
+            sold_items.append(sold_item)
+    return sold_items
+
+def _fetch_ebay_page(keywords: str, limit: int, offset: int = 0):
+    """
+    Fetch one page of Browse API search results.
+    
+    Args:
+        keywords: The search query
+        limit: Page size (max EBAY_PAGE_SIZE)
+        offset: Number of results to skip
+        
+    Returns:
+        Decoded JSON response, or None if the request failed
+    """
+    # API parameters for the Browse API - search for items
+    params = {
+        'q': keywords,  # Search query
+        'limit': limit,  # Page size
+        'offset': offset,  # Page start
+        'sort': 'price',  # Sort by price
+    }
+
+    # Headers for the Browse API (marketplace and content type are set on the pooled session)
+    headers = {
+        'Authorization': f'Bearer {EBAY_ACCESS_TOKEN}',  # OAuth access token
+    }
+    
+    # Rate limiting for eBay API
+    ebay_rate_limiter.acquire()
+    
+    try:
+        # Make the actual HTTP request to eBay Browse API with timeout:
+        logger.info(f"Making request to eBay API with params: {params}")
+        response = get_ebay_session().get(EBAY_BROWSE_API_ENDPOINT, params=params, headers=headers, timeout=30)
+        logger.info(f"Response status code: {response.status_code}")
+            
+        if response.status_code != 200:
+            logger.error(f"Response text: {response.text[:1000]}...")  # Show first 1000 chars of error
+            response.raise_for_status()
+            
+        return response.json()
+
+    except requests.exceptions.Timeout:
+        logger.error("❌ eBay API request timed out (30s). Please try again.")
+        batch_concurrency.record_throttle('ebay', 'timeout')
+        return None
+    except requests.exceptions.ConnectionError as e:
+        logger.error(f"❌ Network connection error: {e}")
+        logger.error("Please check your internet connection and try again.")
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ API Request Error: {e}")
+        logger.error(f"Request details: {params}")
+        if _is_throttling_error(e):
+            batch_concurrency.record_throttle('ebay', 'rate limited (429)')
+        return None
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Error: Could not decode JSON response from eBay API: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ An unexpected error occurred: {e}")
+        logger.error(f"Error type: {type(e).__name__}")
+        return None
+
+def _remaining_page_offsets(first_page: Dict, max_results: int) -> List[int]:
+    """Work out the offsets still to fetch after the first page."""
+    total = min(first_page.get('total', 0), max_results, EBAY_MAX_OFFSET)
+    return list(range(EBAY_PAGE_SIZE, total, EBAY_PAGE_SIZE))
+
+def iter_completed_sales(keywords, max_results=10, days_back=30):
+    """
+    Generator version of search_completed_sales that pages through the Browse API.
+    
+    The first page is fetched immediately; the remaining pages are fetched concurrently
+    (under the eBay rate limiter) while the caller is already consuming earlier listings,
+    so scoring can start on page 1 while later pages download.
+    
+    Args:
+        keywords (str): The search query (e.g., "2004 Silver Eagle").
+        max_results (int): Maximum number of results to yield across all pages.
+        days_back (int): Number of days back to search (not used in Browse API).
+
+    Yields:
+        dict: One sold item at a time, pages in completion order.
+    """
+    if not _ebay_token_configured():
+        return
+
+    logger.info(f"Searching sold items for '{keywords}'...")
+    logger.info(f"Using endpoint: {EBAY_BROWSE_API_ENDPOINT}")
+    logger.info("Note: This shows sold items, not necessarily completed transactions.")
+    
+    first_page = _fetch_ebay_page(keywords, min(max_results, EBAY_PAGE_SIZE), 0)
+    if not first_page:
+        return
+    
+    yielded = 0
+    for item in _parse_item_summaries(first_page)[:max_results]:
+        yield item
+        yielded += 1
+    
+    offsets = _remaining_page_offsets(first_page, max_results)
+    if not offsets or yielded >= max_results:
+        return
+    
+    logger.info(f"📄 Fetching {len(offsets)} more pages for '{keywords}'")
+    executor = ThreadPoolExecutor(max_workers=EBAY_PAGE_FETCH_WORKERS)
+    try:
+        futures = [
+            executor.submit(_fetch_ebay_page, keywords, min(EBAY_PAGE_SIZE, max_results - offset), offset)
+            for offset in offsets
+        ]
+        for future in as_completed(futures):
+            for item in _parse_item_summaries(future.result()):
+                if yielded >= max_results:
+                    return
+                yield item
+                yielded += 1
+    finally:
+        # Don't keep downloading pages nobody will read
+        executor.shutdown(wait=False, cancel_futures=True)
+
 def search_completed_sales(keywords, max_results=10, days_back=30):
     """
     Searches for sold items using the Browse API with soldItems filter.
     
     Args:
         keywords (str): The search query (e.g., "2004 Silver Eagle").
-        max_results (int): Maximum number of results to return (max 50 per page).
+        max_results (int): Maximum number of results to return (paged, EBAY_PAGE_SIZE per page).
         days_back (int): Number of days back to search (not used in Browse API).
 
     Returns:
         list: A list of dictionaries, each representing a sold item.
               Returns an empty list if no results or an error occurs.
     """
-    if not EBAY_ACCESS_TOKEN or EBAY_ACCESS_TOKEN == 'YOUR_OAUTH_ACCESS_TOKEN':
-        print("❌ ERROR: EBAY_ACCESS_TOKEN not set or invalid")
-        print("   Please set EBAY_ACCESS_TOKEN environment variable on Render")
-        return []
+    return list(iter_completed_sales(keywords, max_results, days_back))
 
-    # API parameters for the Browse API - search for items
-    params = {
-        'q': keywords,  # Search query
-        'limit': min(max_results, 50),  # Limit results (max 50 per page)
-        'sort': 'price',  # Sort by price
-    }
+# Built-in listing filter rules: keywords grouped by category
+DEFAULT_COIN_FILTER_RULES = {
+    'exclude': {
+        # Completely wrong items
+        'wrong_item': ['oil filter', 'honda', 'accord', 'civic', 'pilot'],
+        # Accessories only
+        'accessory_only': ['box only', 'coa only', 'empty', 'no coin', 'capsule only']
+    },
+    'include': {}
+}
+
+class CoinFilterRuleSet:
+    """
+    Precompiled keyword matcher for filtering listing titles.
+    All keywords of a rule set are compiled into one regex whose alternation is factored
+    as a prefix trie, so each title is scanned once and shared prefixes are only compared
+    once no matter how many rules there are. Exclude rules reject a title
+    containing any of their keywords; when include rules are configured, a title must
+    also contain at least one include keyword to be kept.
+    """
+    
+    def __init__(self, exclude: Dict[str, List[str]] = None, include: Dict[str, List[str]] = None):
+        self.exclude = {category: list(keywords) for category, keywords in (exclude or {}).items()}
+        self.include = {category: list(keywords) for category, keywords in (include or {}).items()}
+        self._exclude_pattern, self._exclude_rules = self._compile(self.exclude)
+        self._include_pattern, self._include_rules = self._compile(self.include)
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'CoinFilterRuleSet':
+        """Load a rule set from a JSON file with "exclude" and "include" category maps."""
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config.get('exclude'), config.get('include'))
+    
+    @staticmethod
+    def _compile(categories: Dict[str, List[str]]):
+        """Compile every (lowercased) keyword into one trie-factored regex."""
+        rules = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                rules.setdefault(keyword.lower(), f"{category}:{keyword.lower()}")
+        if not rules:
+            return None, rules
+        
+        trie = {}
+        for keyword in rules:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}  # End of a keyword
+        
+        def to_regex(node):
+            branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            ends_here = '' in node
+            pattern = branches[0] if len(branches) == 1 and not ends_here else '(?:' + '|'.join(branches) + ')'
+            # Greedy optional suffix: the longest keyword wins, shorter ones still match
+            return pattern + '?' if ends_here else pattern
+        
+        return re.compile(to_regex(trie)), rules
+    
+    def rejection_rule(self, title: str):
+        """
+        Return the rule ("category:keyword") that rejects this title, or None if it passes.
+        Titles failing the include rules are reported as "include:none".
+        """
+        title = title.lower()
+        if self._exclude_pattern is not None:
+            match = self._exclude_pattern.search(title)
+            if match:
+                return self._exclude_rules[match.group(0)]
+        if self._include_pattern is not None and not self._include_pattern.search(title):
+            return 'include:none'
+        return None
+    
+    def stats(self) -> Dict:
+        """Return rule counts per category."""
+        return {
+            'exclude': {category: len(keywords) for category, keywords in self.exclude.items()},
+            'include': {category: len(keywords) for category, keywords in self.include.items()}
+        }
 
-    # Headers for the Browse API
-    headers = {
-        'Authorization': f'Bearer {EBAY_ACCESS_TOKEN}',  # OAuth access token
-        'X-EBAY-C-MARKETPLACE-ID': 'EBAY-US',  # US marketplace
-        'Content-Type': 'application/json'
-    }
+_coin_filter_rules = None
+_coin_filter_rules_lock = threading.Lock()
 
-    logger.info(f"Searching sold items for '{keywords}'...")
-    logger.info(f"Using endpoint: {EBAY_BROWSE_API_ENDPOINT}")
-    logger.info(f"Token length: {len(EBAY_ACCESS_TOKEN) if EBAY_ACCESS_TOKEN else 0}")
-    logger.info("Note: This shows sold items, not necessarily completed transactions.")
+def get_coin_filter_rules() -> CoinFilterRuleSet:
+    """Return the shared filter rule set (COIN_FILTER_RULES_PATH if set, built-in rules otherwise)."""
+    global _coin_filter_rules
+    if _coin_filter_rules is None:
+        with _coin_filter_rules_lock:
+            if _coin_filter_rules is None:
+                if COIN_FILTER_RULES_PATH:
+                    _coin_filter_rules = CoinFilterRuleSet.from_file(COIN_FILTER_RULES_PATH)
+                else:
+                    _coin_filter_rules = CoinFilterRuleSet(**DEFAULT_COIN_FILTER_RULES)
+    return _coin_filter_rules
+
+def iter_filtered_coin_items(items, search_query, rules: CoinFilterRuleSet = None, rejected: List[Dict] = None):
+    """
+    Generator version of filter_coin_items.
+    Works on streamed listings so filtering doesn't wait for every page to download.
     
-    # Rate limiting for eBay API
-    global _last_api_call
-    current_time = time.time()
-    time_since_last = current_time - _last_api_call
-    if time_since_last < _ebay_api_call_interval:
-        sleep_time = _ebay_api_call_interval - time_since_last
-        logger.info(f"⏳ Rate limiting: waiting {sleep_time:.1f}s before eBay API call")
-        time.sleep(sleep_time)
+    Args:
+        items: Listings to filter
+        search_query: Original search query
+        rules: Rule set to apply (defaults to get_coin_filter_rules())
+        rejected: Optional list that receives {'title', 'itemId', 'rule'} for every rejected listing
+    """
+    rules = rules or get_coin_filter_rules()
     
-    try:
-        # Make the actual HTTP request to eBay Browse API with timeout:
-        logger.info(f"Making request to eBay API with params: {params}")
-        logger.info(f"Headers: {headers}")
-        response = requests.get(EBAY_BROWSE_API_ENDPOINT, params=params, headers=headers, timeout=30)
-        logger.info(f"Response status code: {response.status_code}")
-        logger.info(f"Response headers: {dict(response.headers)}")
+    for item in items:
+        rule = rules.rejection_rule(item['title'])
         
-        _last_api_call = time.time()  # Update last call time
-            
-        if response.status_code != 200:
-            logger.error(f"Response text: {response.text[:1000]}...")  # Show first 1000 chars of error
-            response.raise_for_status()
-            
-        data = response.json()
-
-        sold_items = []
-        # Parse the JSON response from Browse API
-        if data and 'itemSummaries' in data:
-            for item in data['itemSummaries']:
-                sold_item = {
-                    'itemId': item.get('itemId', 'N/A'),
-                    'title': item.get('title', 'N/A'),
-                    'soldPrice': item.get('price', {}).get('value', 'N/A'),
-                    'currency': item.get('price', {}).get('currency', 'N/A'),
-                    'dateSold': 'N/A',  # Browse API doesn't provide sale date
-                    'condition': item.get('condition', 'N/A'),
-                    'itemLocation': item.get('itemLocation', {}).get('country', 'N/A'),
-                    'shippingCost': item.get('shippingOptions', [{}])[0].get('shippingCost', {}).get('value', 'N/A') if item.get('shippingOptions') else 'N/A',
-                    'totalPrice': 'N/A',  # Browse API doesn't provide total price
-                    'buyingOptions': item.get('buyingOptions', []),
-                    'listingType': 'N/A',  # Browse API doesn't provide listing type
-                    'itemWebUrl': item.get('itemWebUrl', 'N/A'),
-                }
-                sold_items.append(sold_item)
-        return sold_items
-
-    except requests.exceptions.Timeout:
-        logger.error("❌ eBay API request timed out (30s). Please try again.")
-        return []
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"❌ Network connection error: {e}")
-        logger.error("Please check your internet connection and try again.")
-        return []
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ API Request Error: {e}")
-        logger.error(f"Request details: {params}")
-        return []
-    except json.JSONDecodeError as e:
-        logger.error(f"❌ Error: Could not decode JSON response from eBay API: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"❌ An unexpected error occurred: {e}")
-        logger.error(f"Error type: {type(e).__name__}")
-        return []
+        if rule is None:
+            yield item
+            continue
+        
+        logger.debug(f"🚫 Filtered '{item['title']}' ({rule})")
+        if rejected is not None:
+            rejected.append({'title': item['title'], 'itemId': item.get('itemId'), 'rule': rule})
 
-def filter_coin_items(items, search_query):
+def filter_coin_items(items, search_query, rules: CoinFilterRuleSet = None, rejected: List[Dict] = None):
     """
     Basic filter to remove obviously irrelevant items.
     Let the AI handle the detailed analysis.
     """
-    filtered_items = []
+    return list(iter_filtered_coin_items(items, search_query, rules, rejected))
+
+def benchmark_coin_filter(titles: List[str], rules: CoinFilterRuleSet = None, repeat: int = 5) -> Dict:
+    """
+    Micro-benchmark the listing filter.
     
-    # Only exclude completely wrong items
-    exclude_keywords = [
-        'oil filter', 'honda', 'accord', 'civic', 'pilot',  # Completely wrong items
-        'box only', 'coa only', 'empty', 'no coin', 'capsule only'  # Accessories only
-    ]
+    Args:
+        titles: Listing titles to filter
+        rules: Rule set to benchmark (defaults to get_coin_filter_rules())
+        repeat: Number of passes over the titles; the fastest pass is reported
+        
+    Returns:
+        Dictionary with titles filtered per second and rejection count
+    """
+    rules = rules or get_coin_filter_rules()
+    best = float('inf')
+    rejections = 0
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        rejections = sum(1 for title in titles if rules.rejection_rule(title) is not None)
+        best = min(best, time.perf_counter() - start)
+    
+    return {
+        'titles': len(titles),
+        'rejected': rejections,
+        'seconds': round(best, 6),
+        'titles_per_second': round(len(titles) / best) if best > 0 else None
+    }
+
+# --- Listing Deduplication ---
+
+class ListingDeduplicator:
+    """
+    Identifies the same eBay item across the queries of a batch run.
+    Listings are matched by itemId only: identical titles from one seller are
+    separate units sold (dealers list many under the same title), so sharing them
+    would hand one query another sale's price. Matching listings share one canonical
+    dictionary so overlapping searches don't hold separate copies, and each query
+    sees every item once, so each (item, query) pair is scored a single time.
+    """
     
-    for item in items:
-        title = item['title'].lower()
+    def __init__(self):
+        """Create an empty deduplicator (one per batch run)."""
+        self.listings_seen = 0
+        self.shared_across_queries = 0
+        self.duplicates_dropped = 0
+        self._by_item_id = {}  # itemId -> canonical listing
+        self._queries_by_item = {}  # itemId -> normalized queries that used it
+        self._lock = threading.Lock()
+    
+    def canonicalize(self, listing: Dict) -> Dict:
+        """Return the shared canonical listing for this item, registering it if new."""
+        item_id = listing.get('itemId')
+        with self._lock:
+            self.listings_seen += 1
+            if not item_id or item_id == 'N/A':
+                return listing
+            return self._by_item_id.setdefault(item_id, listing)
+    
+    def iter_unique(self, listings: Iterable[Dict], search_query: str):
+        """
+        Yield each item of a query's listing stream once (by itemId), as its canonical listing.
         
-        # Only exclude if it's clearly not a coin
-        should_exclude = any(keyword in title for keyword in exclude_keywords)
+        Args:
+            listings: Listings for one query (list or stream)
+            search_query: The query the listings were fetched for
+        """
+        query = normalize_search_query(search_query)
+        seen_item_ids = set()
         
-        if not should_exclude:
-            filtered_items.append(item)
-    
-    return filtered_items
+        for listing in listings:
+            item_id = listing.get('itemId')
+            if not item_id or item_id == 'N/A':
+                # Without an itemId the listing can't be matched; keep it as is
+                with self._lock:
+                    self.listings_seen += 1
+                yield listing
+                continue
+            if item_id in seen_item_ids:
+                with self._lock:
+                    self.listings_seen += 1
+                    self.duplicates_dropped += 1
+                continue
+            seen_item_ids.add(item_id)
+            
+            canonical = self.canonicalize(listing)
+            with self._lock:
+                queries = self._queries_by_item.setdefault(item_id, set())
+                if queries and query not in queries:
+                    self.shared_across_queries += 1
+                queries.add(query)
+            yield canonical
+    
+    def stats(self) -> Dict:
+        """Return deduplication counters."""
+        with self._lock:
+            return {
+                'listings_seen': self.listings_seen,
+                'unique_items': len(self._queries_by_item),
+                'duplicates_dropped': self.duplicates_dropped,
+                'shared_across_queries': self.shared_across_queries
+            }
+
+def iter_unique_item_ids(listings: Iterable[Dict]):
+    """Drop repeated itemIds (e.g. overlapping pages) from one query's listing stream."""
+    seen_item_ids = set()
+    for listing in listings:
+        item_id = listing.get('itemId')
+        if item_id and item_id != 'N/A':
+            if item_id in seen_item_ids:
+                continue
+            seen_item_ids.add(item_id)
+        yield listing
 
 # --- Comprehensive Analysis Functions ---
 
@@ -507,60 +2604,8 @@ def generate_comprehensive_report(analysis_results: Dict, search_query: str) ->
         print("⚠️  No listings met the confidence threshold.")
         return analysis_results
     
-    # Calculate weighted price statistics
-    prices = []
-    weights = []
-    
-    for listing in scored_listings:
-        price = listing.get('soldPrice', 'N/A')
-        confidence = listing['confidence_analysis']['confidence_score']
-        
-        if price != 'N/A':
-            try:
-                price_float = float(price)
-                prices.append(price_float)
-                weights.append(confidence / 100.0)  # Convert to 0-1 scale
-            except ValueError:
-                continue
-    
-    # Calculate weighted statistics
-    weighted_stats = {}
-    if prices and weights:
-        total_weight = sum(weights)
-        weighted_avg = sum(p * w for p, w in zip(prices, weights)) / total_weight
-        
-        # Sort by price for percentile calculations
-        sorted_data = sorted(zip(prices, weights))
-        sorted_prices = [p for p, w in sorted_data]
-        sorted_weights = [w for p, w in sorted_data]
-        
-        # Calculate weighted percentiles
-        cumulative_weight = 0
-        median_price = None
-        p25_price = None
-        p75_price = None
-        
-        for i, (price, weight) in enumerate(sorted_data):
-            cumulative_weight += weight
-            weight_percentile = cumulative_weight / total_weight
-            
-            if median_price is None and weight_percentile >= 0.5:
-                median_price = price
-            if p25_price is None and weight_percentile >= 0.25:
-                p25_price = price
-            if p75_price is None and weight_percentile >= 0.75:
-                p75_price = price
-        
-        weighted_stats = {
-            'weighted_average': round(weighted_avg, 2),
-            'median_price': median_price,
-            'p25_price': p25_price,
-            'p75_price': p75_price,
-            'min_price': min(prices),
-            'max_price': max(prices),
-            'price_range': max(prices) - min(prices),
-            'total_weighted_sales': len(prices)
-        }
+    # Calculate weighted price statistics (vectorized)
+    weighted_stats = listing_price_statistics(scored_listings)
     
     # Create comprehensive report
     comprehensive_results = {
@@ -731,36 +2776,267 @@ def save_comprehensive_results(results: Dict, filename: str = None):
         print(f"❌ Error saving results: {e}")
         return None
 
+# --- Delta Refresh ---
+
+class AnalysisSnapshotStore:
+    """
+    In-memory LRU of the complete scored listing set behind each analysis (every score,
+    not just those above the threshold). When an analysis is recomputed, listings whose
+    itemId and title are unchanged since the snapshot reuse their previous score, so only
+    new listings go through scoring; vanished listings simply drop out.
+    """
+    
+    def __init__(self, max_entries: int = DELTA_SNAPSHOT_MAX_ENTRIES, max_age: float = DELTA_SNAPSHOT_MAX_AGE):
+        """Create an empty snapshot store."""
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.refreshes = 0
+        self.reused = 0
+        self.rescored = 0
+        self.dropped = 0
+        self._snapshots = OrderedDict()  # key -> ({itemId: scored listing}, taken_at)
+        self._lock = threading.Lock()
+    
+    def get(self, key: str):
+        """Return {itemId: scored listing} for a key, or None if missing or too old."""
+        with self._lock:
+            entry = self._snapshots.get(key)
+            if entry is None:
+                return None
+            listings, taken_at = entry
+            if time.time() - taken_at > self.max_age:
+                del self._snapshots[key]
+                return None
+            self._snapshots.move_to_end(key)
+            return listings
+    
+    def put(self, key: str, scored_listings: List[Dict]):
+        """Store the full scored listing set for a key."""
+        snapshot = {
+            listing['itemId']: listing
+            for listing in scored_listings
+            if listing.get('itemId') and listing['itemId'] != 'N/A'
+        }
+        with self._lock:
+            self._snapshots[key] = (snapshot, time.time())
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+    
+    def record_refresh(self, reused: int, rescored: int, dropped: int):
+        """Count the outcome of one delta refresh."""
+        with self._lock:
+            self.refreshes += 1
+            self.reused += reused
+            self.rescored += rescored
+            self.dropped += dropped
+    
+    def stats(self) -> Dict:
+        """Return snapshot count and delta refresh counters."""
+        with self._lock:
+            seen = self.reused + self.rescored
+            return {
+                'snapshots': len(self._snapshots),
+                'refreshes': self.refreshes,
+                'reused_listings': self.reused,
+                'rescored_listings': self.rescored,
+                'dropped_listings': self.dropped,
+                'reuse_rate': round(self.reused / seen, 3) if seen else 0
+            }
+
+_analysis_snapshots = AnalysisSnapshotStore()
+
+def get_delta_refresh_stats() -> Dict:
+    """Snapshot and delta refresh counters (for status endpoints)."""
+    return _analysis_snapshots.stats()
+
+def _analysis_snapshot_key(search_query: str, max_results: int, days_back: int) -> str:
+    """Snapshot key; independent of min_confidence because snapshots keep every score."""
+    return f"{normalize_search_query(search_query)}_{max_results}_{days_back}"
+
+def _iter_delta_listings(listings: Iterable[Dict], snapshot: Dict[str, Dict], reused: List[Dict]):
+    """
+    Yield listings that need scoring.
+    Listings whose itemId and title match the snapshot get the previous score (with the
+    current listing data) and are appended to reused instead.
+    """
+    for listing in listings:
+        previous = snapshot.get(listing.get('itemId')) if snapshot else None
+        if previous is not None and previous.get('title') == listing.get('title'):
+            reused_listing = listing.copy()
+            reused_listing['confidence_analysis'] = previous['confidence_analysis']
+            reused.append(reused_listing)
+        else:
+            yield listing
+
+def _merge_delta_analysis(scorer: 'eBayConfidenceScorer', search_query: str, min_confidence: int,
+                          new_results: Dict, reused: List[Dict], snapshot: Dict[str, Dict],
+                          snapshot_key: str):
+    """
+    Combine reused and newly scored listings, save the merged set as the next snapshot
+    and rebuild the analysis results for min_confidence.
+    
+    Args:
+        new_results: analyze_listings() output for the new listings, run with min_confidence=0
+        reused: Listings that kept their snapshot score
+        snapshot: The previous snapshot (None on a full analysis)
+        
+    Returns:
+        (analysis_results, merged) where merged is every scored listing, before the min_confidence filter
+    """
+    merged = reused + new_results['scored_listings']
+    _analysis_snapshots.put(snapshot_key, merged)
+    
+    delta = None
+    if snapshot is not None:
+        delta = {
+            'reused': len(reused),
+            'rescored': new_results['total_listings_analyzed'],
+            'dropped': len(snapshot.keys() - {listing['itemId'] for listing in merged})
+        }
+        _analysis_snapshots.record_refresh(delta['reused'], delta['rescored'], delta['dropped'])
+        print(f"♻️  Delta refresh: {delta['reused']} unchanged listings reused, "
+              f"{delta['rescored']} new scored, {delta['dropped']} dropped")
+    
+    analysis_results = scorer._summarize_analysis(
+        search_query,
+        new_results['total_listings_analyzed'] + len(reused),
+        [listing for listing in merged if listing['confidence_analysis']['confidence_score'] >= min_confidence],
+        new_results['token_usage']
+    )
+    analysis_results['delta_refresh'] = delta
+    return analysis_results, merged
+
 # --- Main Workflow Function ---
 
+def _analysis_cache_key(search_query: str, max_results: int, min_confidence: int, days_back: int) -> str:
+    """Build the result cache key for an analysis request."""
+    return f"{search_query}_{max_results}_{min_confidence}_{days_back}"
+
+def _get_cached_analysis(cache_key: str, search_query: str):
+    """Return a fresh cached analysis result, or None (expired entries are removed)."""
+    cached, cache_age = _result_cache.get_with_age(cache_key)
+    if cached is not None:
+        print(f"✅ Using cached result for '{search_query}' (age: {cache_age:.1f}s)")
+    return cached
+
+def _store_cached_analysis(cache_key: str, search_query: str, results: Dict, computed_at: float):
+    """Cache an analysis result."""
+    _result_cache.set(cache_key, results, computed_at)
+    print(f"✅ Cached result for '{search_query}'")
+
 def complete_ebay_analysis(search_query: str, max_results: int = MAX_RESULTS_DEFAULT, 
-                          min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90) -> Dict:
+                          min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90,
+                          scoring_scheduler: CrossQueryScoringScheduler = None,
+                          deduplicator: ListingDeduplicator = None, refresh: bool = False) -> Dict:
     """
-    Complete workflow: Search eBay → Filter → AI Confidence Scoring → Analysis
+    Complete workflow: Search eBay → Filter → Deduplicate → AI Confidence Scoring → Analysis
     
     Args:
         search_query: The search query (e.g., "2004 Silver Eagle MS69")
         max_results: Maximum number of results to analyze
         min_confidence: Minimum confidence score to include (0-100)
         days_back: Number of days back to search
+        scoring_scheduler: Optional scheduler that packs this query's listings into
+            prompts shared with other queries of a batch run
+        deduplicator: Optional deduplicator shared by the queries of a batch run
+        refresh: Skip the cache lookup and recompute (the result is still cached)
         
     Returns:
         Dictionary with comprehensive analysis results
     """
     # Check cache first
-    cache_key = f"{search_query}_{max_results}_{min_confidence}_{days_back}"
-    current_time = time.time()
+    cache_key = _analysis_cache_key(search_query, max_results, min_confidence, days_back)
     
-    if cache_key in _result_cache:
-        cache_age = current_time - _cache_timestamps.get(cache_key, 0)
-        if cache_age < CACHE_TTL:
-            print(f"✅ Using cached result for '{search_query}' (age: {cache_age:.1f}s)")
-            return _result_cache[cache_key]
-        else:
-            # Remove expired cache entry
-            del _result_cache[cache_key]
-            if cache_key in _cache_timestamps:
-                del _cache_timestamps[cache_key]
+    cached = None if refresh else _get_cached_analysis(cache_key, search_query)
+    if cached is not None:
+        return cached
+    
+    # Coalesce concurrent identical requests: one caller runs the pipeline, the rest share its result
+    return _analysis_flights.do(
+        cache_key, _run_ebay_analysis, search_query, max_results, min_confidence, days_back, cache_key,
+        scoring_scheduler, deduplicator, refresh
+    )
+
+def complete_ebay_analysis_with_status(search_query: str, max_results: int = MAX_RESULTS_DEFAULT,
+                                      min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90):
+    """
+    complete_ebay_analysis with stale-while-revalidate caching.
+    A result past CACHE_TTL but within CACHE_STALE_GRACE is returned immediately while a
+    background refresh (coalesced with any other run for the same key) recomputes it.
+    
+    Returns:
+        (results, cache_info) where cache_info has status ('hit', 'stale' or 'miss'),
+        age_seconds, ttl_seconds and refreshing
+    """
+    cache_key = _analysis_cache_key(search_query, max_results, min_confidence, days_back)
+    
+    cached, cache_age = _result_cache.get_with_age(cache_key, allow_stale=True)
+    get_cache_warmer().record_request(
+        search_query, max_results, min_confidence, days_back,
+        'miss' if cached is None else 'stale' if cache_age >= _result_cache.ttl else 'hit'
+    )
+    if cached is not None:
+        stale = cache_age >= _result_cache.ttl
+        if stale:
+            print(f"⏳ Serving stale result for '{search_query}' (age: {cache_age:.1f}s), refreshing in background")
+            _schedule_background_refresh(search_query, max_results, min_confidence, days_back, cache_key)
+        return cached, {
+            'status': 'stale' if stale else 'hit',
+            'age_seconds': round(cache_age, 1),
+            'ttl_seconds': _result_cache.ttl,
+            'refreshing': stale or _analysis_flights.in_flight(cache_key) or cache_key in _pending_refreshes
+        }
+    
+    results = _analysis_flights.do(
+        cache_key, _run_ebay_analysis, search_query, max_results, min_confidence, days_back, cache_key
+    )
+    return results, {'status': 'miss', 'age_seconds': 0, 'ttl_seconds': _result_cache.ttl, 'refreshing': False}
+
+_stale_refresh_executor = ThreadPoolExecutor(max_workers=STALE_REFRESH_WORKERS, thread_name_prefix='stale-refresh')
+_pending_refreshes = set()  # Cache keys with a background refresh queued or running
+_pending_refreshes_lock = threading.Lock()
+
+def _schedule_background_refresh(search_query: str, max_results: int, min_confidence: int, days_back: int,
+                                 cache_key: str):
+    """Start a background recompute of a stale result unless one is already queued or running."""
+    if _analysis_flights.in_flight(cache_key):
+        return
+    with _pending_refreshes_lock:
+        if cache_key in _pending_refreshes:
+            return
+        _pending_refreshes.add(cache_key)
+    try:
+        _stale_refresh_executor.submit(
+            _refresh_analysis, search_query, max_results, min_confidence, days_back, cache_key
+        )
+    except Exception:
+        with _pending_refreshes_lock:
+            _pending_refreshes.discard(cache_key)
+        raise
+
+def _refresh_analysis(search_query: str, max_results: int, min_confidence: int, days_back: int, cache_key: str):
+    """Recompute an analysis in the background; the stale entry stays served until this finishes."""
+    try:
+        _analysis_flights.do(
+            cache_key, _run_ebay_analysis, search_query, max_results, min_confidence, days_back, cache_key
+        )
+    except Exception as e:
+        logger.error(f"❌ Background refresh failed for '{search_query}': {e}")
+    finally:
+        with _pending_refreshes_lock:
+            _pending_refreshes.discard(cache_key)
+
+def _run_ebay_analysis(search_query: str, max_results: int, min_confidence: int, days_back: int,
+                       cache_key: str, scoring_scheduler: CrossQueryScoringScheduler = None,
+                       deduplicator: ListingDeduplicator = None, refresh: bool = False) -> Dict:
+    """Run the full pipeline for a cache miss (or forced refresh) and cache the result (single-flight leader only)."""
+    # A previous leader may have finished between our cache check and taking the lead
+    cached = None if refresh else _result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    current_time = time.time()
     
     logger.info(f"\n{'='*60}")
     logger.info(f"🚀 COMPLETE EBAY AI ANALYSIS WORKFLOW")
@@ -770,46 +3046,416 @@ def complete_ebay_analysis(search_query: str, max_results: int = MAX_RESULTS_DEF
     logger.info(f"Min Confidence: {min_confidence}%")
     logger.info(f"Search Period: Last {days_back} days")
     
-    # Step 1: Search eBay for listings
+    # Step 1: Search eBay for listings (streamed; later pages download while early ones are scored)
     logger.info(f"\n📊 Step 1: Searching eBay listings...")
-    listings = search_completed_sales(search_query, max_results, days_back)
+    listings = iter_completed_sales(search_query, max_results, days_back)
+    first_listing = next(listings, None)
     
-    if not listings:
+    if first_listing is None:
         print("❌ No listings found. Try adjusting your search terms.")
         return None
     
-    print(f"✅ Found {len(listings)} listings")
-    
-    # Step 2: Apply basic filtering
-    print(f"\n🔍 Step 2: Applying basic filtering...")
-    filtered_listings = filter_coin_items(listings, search_query)
-    print(f"✅ After filtering: {len(filtered_listings)} relevant listings")
-    
-    if not filtered_listings:
-        print("❌ No relevant listings found after filtering.")
-        return None
+    # Step 2: Apply basic filtering and drop duplicate items (shared with the other queries in batch runs)
+    print(f"\n🔍 Step 2: Applying basic filtering as pages arrive...")
+    rejected_listings = []
+    filtered_listings = iter_filtered_coin_items(chain([first_listing], listings), search_query, rejected=rejected_listings)
+    if deduplicator is not None:
+        filtered_listings = deduplicator.iter_unique(filtered_listings, search_query)
+    else:
+        filtered_listings = iter_unique_item_ids(filtered_listings)
     
     # Step 3: Initialize AI confidence scorer
     print(f"\n🤖 Step 3: Initializing AI confidence scorer...")
-    confidence_scorer = eBayConfidenceScorer()
+    if scoring_scheduler is not None:
+        confidence_scorer = eBayConfidenceScorer(scheduler=scoring_scheduler)
+    else:
+        confidence_scorer = get_confidence_scorer()
     
-    # Step 4: Apply confidence scoring
+    # Step 4: Apply confidence scoring (only listings new since the last snapshot on a refresh)
     print(f"\n🎯 Step 4: Applying AI confidence scoring...")
-    analysis_results = confidence_scorer.analyze_listings(
-        filtered_listings, search_query, min_confidence
+    snapshot_key = _analysis_snapshot_key(search_query, max_results, days_back)
+    snapshot = _analysis_snapshots.get(snapshot_key) if DELTA_REFRESH_ENABLED else None
+    reused_listings = []
+    new_results = confidence_scorer.analyze_listings(
+        _iter_delta_listings(filtered_listings, snapshot, reused_listings), search_query, 0
+    )
+    analysis_results, all_scored_listings = _merge_delta_analysis(
+        confidence_scorer, search_query, min_confidence, new_results, reused_listings, snapshot, snapshot_key
     )
+    print(f"✅ After filtering: {analysis_results['total_listings_analyzed']} relevant listings "
+          f"({len(rejected_listings)} rejected by filter rules)")
+    analysis_results['filter_rejections'] = rejected_listings
+    
+    if not analysis_results['total_listings_analyzed']:
+        print("❌ No relevant listings found after filtering.")
+        return None
     
     # Step 5: Generate comprehensive report
     print(f"\n📈 Step 5: Generating comprehensive report...")
     comprehensive_results = generate_comprehensive_report(analysis_results, search_query)
+    _record_sales_history(search_query, all_scored_listings)
     
     # Cache the result
-    _result_cache[cache_key] = comprehensive_results
-    _cache_timestamps[cache_key] = current_time
-    print(f"✅ Cached result for '{search_query}'")
+    _store_cached_analysis(cache_key, search_query, comprehensive_results, current_time)
+    
+    return comprehensive_results
+
+async def _fetch_ebay_page_async(keywords: str, limit: int, offset: int = 0):
+    """Fetch one Browse API page in a worker thread, bounded by the per-loop eBay semaphore."""
+    async with _async_semaphore('ebay'):
+        return await asyncio.to_thread(_fetch_ebay_page, keywords, limit, offset)
+
+async def search_completed_sales_async(keywords, max_results=10, days_back=30):
+    """
+    Async variant of search_completed_sales.
+    Fetches the first page, then all remaining pages concurrently; in-flight eBay calls
+    are bounded by the per-loop eBay semaphore and the eBay rate limiter.
+    """
+    if not _ebay_token_configured():
+        return []
+    
+    first_page = await _fetch_ebay_page_async(keywords, min(max_results, EBAY_PAGE_SIZE), 0)
+    if not first_page:
+        return []
+    
+    sold_items = _parse_item_summaries(first_page)
+    offsets = _remaining_page_offsets(first_page, max_results)
+    pages = await asyncio.gather(*(
+        _fetch_ebay_page_async(keywords, min(EBAY_PAGE_SIZE, max_results - offset), offset)
+        for offset in offsets
+    ))
+    for page in pages:
+        sold_items.extend(_parse_item_summaries(page))
+    
+    return sold_items[:max_results]
+
+async def complete_ebay_analysis_async(search_query: str, max_results: int = MAX_RESULTS_DEFAULT,
+                                       min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90) -> Dict:
+    """
+    Asyncio version of complete_ebay_analysis.
+    Overlaps the eBay fetch and all Gemini scoring batches with other work on the event loop.
+    
+    Args:
+        search_query: The search query (e.g., "2004 Silver Eagle MS69")
+        max_results: Maximum number of results to analyze
+        min_confidence: Minimum confidence score to include (0-100)
+        days_back: Number of days back to search
+        
+    Returns:
+        Dictionary with comprehensive analysis results
+    """
+    cache_key = _analysis_cache_key(search_query, max_results, min_confidence, days_back)
+    
+    cached = _get_cached_analysis(cache_key, search_query)
+    if cached is not None:
+        return cached
+    
+    return await _analysis_flights.do_async(
+        cache_key, _run_ebay_analysis_async, search_query, max_results, min_confidence, days_back, cache_key
+    )
+
+async def _run_ebay_analysis_async(search_query: str, max_results: int, min_confidence: int, days_back: int,
+                                   cache_key: str) -> Dict:
+    """Async pipeline body for a cache miss (single-flight leader only)."""
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    current_time = time.time()
+    
+    logger.info(f"🚀 Async analysis for '{search_query}'")
+    listings = await search_completed_sales_async(search_query, max_results, days_back)
+    
+    if not listings:
+        print(f"❌ No listings found for '{search_query}'.")
+        return None
+    
+    rejected_listings = []
+    filtered_listings = filter_coin_items(listings, search_query, rejected=rejected_listings)
+    print(f"✅ '{search_query}': {len(filtered_listings)}/{len(listings)} listings after filtering")
+    
+    if not filtered_listings:
+        print(f"❌ No relevant listings found after filtering for '{search_query}'.")
+        return None
+    
+    confidence_scorer = get_confidence_scorer()
+    snapshot_key = _analysis_snapshot_key(search_query, max_results, days_back)
+    snapshot = _analysis_snapshots.get(snapshot_key) if DELTA_REFRESH_ENABLED else None
+    reused_listings = []
+    new_results = await confidence_scorer.analyze_listings_async(
+        list(_iter_delta_listings(filtered_listings, snapshot, reused_listings)), search_query, 0
+    )
+    analysis_results, all_scored_listings = _merge_delta_analysis(
+        confidence_scorer, search_query, min_confidence, new_results, reused_listings, snapshot, snapshot_key
+    )
+    analysis_results['filter_rejections'] = rejected_listings
+    
+    comprehensive_results = generate_comprehensive_report(analysis_results, search_query)
+    await asyncio.to_thread(_record_sales_history, search_query, all_scored_listings)
+    
+    _store_cached_analysis(cache_key, search_query, comprehensive_results, current_time)
     
     return comprehensive_results
 
+# --- Cache Warmer ---
+
+def parse_watchlist_queries(text: str) -> List[str]:
+    """Split a configured watchlist (';' or newline separated) into unique, non-empty queries."""
+    queries = []
+    for query in re.split(r'[;\n]', text or ''):
+        query = query.strip()
+        if query and query not in queries:
+            queries.append(query)
+    return queries
+
+class CacheWarmer:
+    """
+    Background scheduler that recomputes watched analyses shortly before they expire.
+    The watchlist holds configured queries plus queries learned from interactive
+    requests (an exponentially decayed request count). Each pass refreshes the due
+    entries with the highest popularity × staleness first, within an hourly refresh
+    budget, and steps aside while interactive analyses are busy or an upstream is
+    throttling. Refreshes go through complete_ebay_analysis, so they share the rate
+    limiters, single-flight and delta refresh with interactive traffic.
+    """
+    
+    def __init__(self, cache: AnalysisResultCache, configured_queries: Iterable[str] = (),
+                 enabled: bool = CACHE_WARMER_ENABLED, interval: float = CACHE_WARMER_INTERVAL,
+                 refresh_ahead: float = CACHE_WARMER_REFRESH_AHEAD,
+                 max_refreshes_per_hour: int = CACHE_WARMER_MAX_REFRESHES_PER_HOUR,
+                 max_watchlist: int = CACHE_WARMER_MAX_WATCHLIST, min_popularity: float = CACHE_WARMER_MIN_POPULARITY,
+                 popularity_half_life: float = CACHE_WARMER_POPULARITY_HALF_LIFE,
+                 throttle_pause: float = CACHE_WARMER_THROTTLE_PAUSE):
+        """Create a warmer watching configured_queries (with the default analysis parameters)."""
+        self.cache = cache
+        self.enabled = enabled
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.max_refreshes_per_hour = max_refreshes_per_hour
+        self.max_watchlist = max_watchlist
+        self.min_popularity = min_popularity
+        self.popularity_half_life = popularity_half_life
+        self.throttle_pause = throttle_pause
+        self.passes = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.budget_exhausted = 0
+        self.yielded = 0
+        self._entries = {}  # result cache key -> watchlist entry
+        self._refresh_times = deque()  # Refresh start times within the last hour
+        self._paused_until = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        
+        for query in configured_queries:
+            self.watch(query, configured=True)
+    
+    def watch(self, search_query: str, max_results: int = MAX_RESULTS_DEFAULT,
+              min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90, configured: bool = False) -> Dict:
+        """Add an analysis to the watchlist (or return the existing entry)."""
+        key = _analysis_cache_key(search_query, max_results, min_confidence, days_back)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {
+                    'search_query': search_query,
+                    'max_results': max_results,
+                    'min_confidence': min_confidence,
+                    'days_back': days_back,
+                    'configured': configured,
+                    'popularity': 0.0,
+                    'popularity_updated': time.time(),
+                    'last_refresh_attempt': 0.0,
+                    'requests': {'hit': 0, 'stale': 0, 'miss': 0}
+                }
+                self._entries[key] = entry
+                self._prune_locked()
+            entry['configured'] = entry['configured'] or configured
+            return entry
+    
+    def record_request(self, search_query: str, max_results: int, min_confidence: int, days_back: int,
+                       cache_status: str):
+        """Count an interactive request and how the result cache served it ('hit', 'stale' or 'miss')."""
+        if not self.enabled:
+            return
+        entry = self.watch(search_query, max_results, min_confidence, days_back)
+        now = time.time()
+        with self._lock:
+            entry['popularity'] = self._popularity_locked(entry, now) + 1.0
+            entry['popularity_updated'] = now
+            entry['requests'][cache_status] = entry['requests'].get(cache_status, 0) + 1
+    
+    def _popularity_locked(self, entry: Dict, now: float) -> float:
+        """Decayed request count of an entry. Caller must hold the lock."""
+        elapsed = max(0.0, now - entry['popularity_updated'])
+        return entry['popularity'] * 0.5 ** (elapsed / self.popularity_half_life)
+    
+    def _prune_locked(self):
+        """Drop the least popular learned entries beyond max_watchlist. Caller must hold the lock."""
+        excess = len(self._entries) - self.max_watchlist
+        if excess <= 0:
+            return
+        now = time.time()
+        learned = sorted(
+            (key for key, entry in self._entries.items() if not entry['configured']),
+            key=lambda key: self._popularity_locked(self._entries[key], now)
+        )
+        for key in learned[:excess]:
+            del self._entries[key]
+    
+    def due_entries(self, now: float = None) -> List[Dict]:
+        """
+        Watched analyses that need a refresh, highest priority first.
+        
+        Returns:
+            Entries that are missing from the cache or within refresh_ahead of expiring, each
+            with its cache key, popularity, staleness (age / ttl, cold entries count as fully
+            expired past the grace window) and priority (popularity × staleness)
+        """
+        now = now or time.time()
+        ttl = self.cache.ttl
+        refresh_after = max(0.0, ttl - self.refresh_ahead)
+        due = []
+        with self._lock:
+            for key, entry in self._entries.items():
+                popularity = self._popularity_locked(entry, now)
+                if not entry['configured'] and popularity < self.min_popularity:
+                    continue
+                # A refresh that produced no cacheable result is not retried before it would have expired
+                if now - entry['last_refresh_attempt'] < refresh_after:
+                    continue
+                age = self.cache.age(key)
+                if age is not None and age < refresh_after:
+                    continue
+                staleness = (ttl + self.cache.stale_grace) / ttl if age is None else age / ttl
+                weight = max(popularity, 1.0) if entry['configured'] else popularity
+                due.append(dict(entry, cache_key=key, popularity=popularity, staleness=staleness,
+                                priority=weight * staleness))
+        due.sort(key=lambda item: item['priority'], reverse=True)
+        return due
+    
+    def _budget_remaining_locked(self, now: float) -> int:
+        """Refreshes left in the current hour. Caller must hold the lock."""
+        while self._refresh_times and now - self._refresh_times[0] >= 3600:
+            self._refresh_times.popleft()
+        return self.max_refreshes_per_hour - len(self._refresh_times)
+    
+    def run_once(self) -> int:
+        """Refresh due entries in priority order until the budget runs out. Returns the number refreshed."""
+        with self._lock:
+            self.passes += 1
+        refreshed = 0
+        for entry in self.due_entries():
+            now = time.time()
+            with self._lock:
+                if now < self._paused_until:
+                    break
+                if self._budget_remaining_locked(now) <= 0:
+                    self.budget_exhausted += 1
+                    break
+            # Interactive analyses take priority over warming
+            if get_single_flight_stats()['in_flight'] >= MAX_CONCURRENT_REQUESTS:
+                with self._lock:
+                    self.yielded += 1
+                break
+            if self._stop.is_set():
+                break
+            
+            with self._lock:
+                self._refresh_times.append(now)
+                self._entries.get(entry['cache_key'], entry)['last_refresh_attempt'] = now
+            
+            try:
+                complete_ebay_analysis(
+                    entry['search_query'], entry['max_results'], entry['min_confidence'], entry['days_back'],
+                    refresh=True
+                )
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                    if _is_throttling_error(e):
+                        self._paused_until = time.time() + self.throttle_pause
+                logger.warning(f"⚠️  Cache warmer failed to refresh '{entry['search_query']}': {e}")
+                continue
+            
+            refreshed += 1
+            with self._lock:
+                self.refreshes += 1
+        
+        if refreshed:
+            logger.info(f"🔥 Cache warmer refreshed {refreshed} watched analyses")
+        return refreshed
+    
+    def start(self) -> bool:
+        """Start the background warmer thread. Returns False if disabled or credentials are missing."""
+        if not self.enabled:
+            return False
+        if not GEMINI_API_KEY or not _ebay_token_configured():
+            logger.warning("⚠️  Cache warmer not started: eBay or Gemini credentials missing")
+            return False
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run_loop, name='cache-warmer', daemon=True)
+                self._thread.start()
+        return True
+    
+    def stop(self):
+        """Stop the warmer thread after its current refresh."""
+        self._stop.set()
+    
+    def _run_loop(self):
+        """Run a warmer pass every interval until stopped."""
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Cache warmer pass failed: {e}")
+    
+    def stats(self) -> Dict:
+        """Return watchlist size, budget usage and the interactive cache outcome for watched queries."""
+        now = time.time()
+        with self._lock:
+            warmed = [
+                entry for entry in self._entries.values()
+                if entry['configured'] or self._popularity_locked(entry, now) >= self.min_popularity
+            ]
+            outcomes = {'hit': 0, 'stale': 0, 'miss': 0}
+            for entry in warmed:
+                for status, count in entry['requests'].items():
+                    outcomes[status] = outcomes.get(status, 0) + count
+            lookups = sum(outcomes.values())
+            return {
+                'enabled': self.enabled,
+                'running': bool(self._thread and self._thread.is_alive()),
+                'watched': len(self._entries),
+                'warmed': len(warmed),
+                'configured': sum(1 for entry in self._entries.values() if entry['configured']),
+                'passes': self.passes,
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'refreshes_last_hour': self.max_refreshes_per_hour - self._budget_remaining_locked(now),
+                'max_refreshes_per_hour': self.max_refreshes_per_hour,
+                'budget_exhausted': self.budget_exhausted,
+                'yielded_to_interactive': self.yielded,
+                'paused': now < self._paused_until,
+                'watched_requests': outcomes,
+                'watched_hit_rate': round(outcomes['hit'] / lookups, 3) if lookups else 0
+            }
+
+_cache_warmer = None
+_cache_warmer_lock = threading.Lock()
+
+def get_cache_warmer() -> CacheWarmer:
+    """Return the process-wide cache warmer, creating it on first use."""
+    global _cache_warmer
+    if _cache_warmer is None:
+        with _cache_warmer_lock:
+            if _cache_warmer is None:
+                _cache_warmer = CacheWarmer(_result_cache, parse_watchlist_queries(CACHE_WARMER_QUERIES))
+    return _cache_warmer
+
 def batch_ebay_analysis(search_queries: List[str], max_results: int = MAX_RESULTS_DEFAULT, 
                        min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90) -> Dict:
     """
@@ -830,11 +3476,51 @@ def batch_ebay_analysis(search_queries: List[str], max_results: int = MAX_RESULT
     all_results = {}
     failed_queries = []
     
-    # Process queries in parallel
-    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+    for query, result, error in iter_batch_ebay_analysis(search_queries, max_results, min_confidence, days_back):
+        if result:
+            all_results[query] = result
+        else:
+            failed_queries.append(query)
+    
+    return _build_batch_summary(search_queries, all_results, failed_queries)
+
+def iter_batch_ebay_analysis(search_queries: List[str], max_results: int = MAX_RESULTS_DEFAULT,
+                             min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90):
+    """
+    Run a batch of queries in parallel and yield each outcome as soon as it completes.
+    
+    Args:
+        search_queries: List of search queries to analyze
+        max_results: Maximum number of results per query
+        min_confidence: Minimum confidence score to include
+        days_back: Number of days back to search
+        
+    Yields:
+        (query, result, error) tuples; result is None when the query failed or found
+        nothing, and error is a short description of the failure (or None)
+    """
+    # Listings from all queries share packed Gemini prompts and fetched listing data for the whole batch
+    scheduler = CrossQueryScoringScheduler() if CROSS_QUERY_PACKING_ENABLED else None
+    deduplicator = ListingDeduplicator()
+    
+    # Process queries in parallel; the adaptive controller decides how many actually run at once
+    try:
+        yield from _iter_batch_results(search_queries, max_results, min_confidence, days_back, scheduler, deduplicator)
+    finally:
+        if scheduler is not None:
+            scheduler.close()
+            print(f"📦 Prompt packing: {scheduler.stats()}")
+        print(f"🧬 Listing deduplication: {deduplicator.stats()}")
+
+def _iter_batch_results(search_queries: List[str], max_results: int, min_confidence: int, days_back: int,
+                        scheduler: CrossQueryScoringScheduler = None, deduplicator: ListingDeduplicator = None):
+    """Run batch queries on the adaptive worker pool and yield (query, result, error) as each completes."""
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY_MAX) as executor:
         # Submit all analysis tasks
         future_to_query = {
-            executor.submit(complete_ebay_analysis, query, max_results, min_confidence, days_back): query
+            executor.submit(
+                _run_with_adaptive_concurrency, query, max_results, min_confidence, days_back, scheduler, deduplicator
+            ): query
             for query in search_queries
         }
         
@@ -845,24 +3531,86 @@ def batch_ebay_analysis(search_queries: List[str], max_results: int = MAX_RESULT
                 # Add timeout to prevent hanging
                 result = future.result(timeout=60)  # 60 second timeout per query
                 if result:
-                    all_results[query] = result
                     print(f"✅ Completed: {query}")
+                    yield query, result, None
                 else:
-                    failed_queries.append(query)
                     print(f"❌ No results for: {query}")
-                    
-                # Add delay between queries to prevent rate limiting
-                time.sleep(2)  # Reduced from 3 to 2 seconds between queries
+                    yield query, None, 'No results found'
                     
             except TimeoutError:
-                failed_queries.append(query)
                 print(f"⏰ Timeout analyzing '{query}' (60s)")
+                yield query, None, 'Timed out after 60s'
             except Exception as e:
-                failed_queries.append(query)
                 print(f"❌ Error analyzing '{query}': {e}")
                 # Continue with other queries instead of failing the entire batch
+                yield query, None, str(e)
+
+def _run_with_adaptive_concurrency(search_query: str, max_results: int, min_confidence: int, days_back: int,
+                                   scheduler: CrossQueryScoringScheduler = None,
+                                   deduplicator: ListingDeduplicator = None):
+    """Run one batch query inside a slot of the adaptive concurrency controller."""
+    batch_concurrency.acquire()
+    start_time = time.time()
+    success = False
+    try:
+        result = complete_ebay_analysis(search_query, max_results, min_confidence, days_back, scheduler, deduplicator)
+        success = True
+        return result
+    finally:
+        batch_concurrency.release(time.time() - start_time, success)
+
+async def batch_ebay_analysis_async(search_queries: List[str], max_results: int = MAX_RESULTS_DEFAULT,
+                                    min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90,
+                                    timeout: float = 60) -> Dict:
+    """
+    Asyncio version of batch_ebay_analysis.
+    All queries run concurrently; per-upstream semaphores and rate limiters keep
+    eBay and Gemini within quota instead of fixed sleeps between queries.
+    
+    Args:
+        search_queries: List of search queries to analyze
+        max_results: Maximum number of results per query
+        min_confidence: Minimum confidence score to include
+        days_back: Number of days back to search
+        timeout: Seconds allowed per query
+        
+    Returns:
+        Dictionary containing results for all queries
+    """
+    print(f"🚀 Starting async batch analysis of {len(search_queries)} queries...")
     
-    # Create batch summary
+    results = await asyncio.gather(
+        *(asyncio.wait_for(
+            complete_ebay_analysis_async(query, max_results, min_confidence, days_back), timeout
+        ) for query in search_queries),
+        return_exceptions=True
+    )
+    
+    all_results = {}
+    failed_queries = []
+    for query, result in zip(search_queries, results):
+        if isinstance(result, asyncio.TimeoutError):
+            failed_queries.append(query)
+            print(f"⏰ Timeout analyzing '{query}' ({timeout}s)")
+        elif isinstance(result, Exception):
+            failed_queries.append(query)
+            print(f"❌ Error analyzing '{query}': {result}")
+        elif result:
+            all_results[query] = result
+            print(f"✅ Completed: {query}")
+        else:
+            failed_queries.append(query)
+            print(f"❌ No results for: {query}")
+    
+    return _build_batch_summary(search_queries, all_results, failed_queries)
+
+def run_batch_ebay_analysis_async(search_queries: List[str], max_results: int = MAX_RESULTS_DEFAULT,
+                                  min_confidence: int = MIN_CONFIDENCE_DEFAULT, days_back: int = 90) -> Dict:
+    """Synchronous entry point that runs batch_ebay_analysis_async on a fresh event loop."""
+    return asyncio.run(batch_ebay_analysis_async(search_queries, max_results, min_confidence, days_back))
+
+def _build_batch_summary(search_queries: List[str], all_results: Dict, failed_queries: List[str]) -> Dict:
+    """Create the batch summary dictionary returned by the batch entry points."""
     batch_summary = {
         'total_queries': len(search_queries),
         'successful_queries': len(all_results),
@@ -972,15 +3720,17 @@ if __name__ == "__main__":
     print(f"\n⚡ Performance Options:")
     print(f"  1. Batch Processing (Parallel - Faster)")
     print(f"  2. Sequential Processing (One by one)")
+    print(f"  3. Async Batch Processing (Overlapped - Fastest)")
     
-    choice = input("Choose processing method (1 or 2): ").strip()
+    choice = input("Choose processing method (1, 2 or 3): ").strip()
     
-    if choice == "1":
+    if choice in ("1", "3"):
         print(f"\n🚀 Starting BATCH PROCESSING...")
         start_time = time.time()
         
         # Perform batch analysis
-        batch_results = batch_ebay_analysis(
+        batch_runner = run_batch_ebay_analysis_async if choice == "3" else batch_ebay_analysis
+        batch_results = batch_runner(
             search_queries=search_queries,
             max_results=20,
             min_confidence=70,
@@ -4,7 +4,7 @@ Flask API for eBay AI Analyzer
 Provides a web API that runs the complete eBay AI analysis workflow
 """
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context
 from flask_cors import CORS
 import json
 import os
@@ -14,10 +14,15 @@ from datetime import datetime
 import threading
 import queue
 import time
+import uuid
 import logging
 
 # Import our analyzer functions
-from Complete_Ebay_AI_Analyzer import complete_ebay_analysis
+from Complete_Ebay_AI_Analyzer import (
+    complete_ebay_analysis_with_status, get_score_cache, get_rate_limiter_stats, get_result_cache_stats,
+    get_single_flight_stats, get_concurrency_stats, get_gemini_registry, GEMINI_MODEL_NAME,
+    get_sales_history, get_delta_refresh_stats, get_cache_warmer
+)
 
 # Set environment variables if not already set (for local development)
 if not os.getenv('EBAY_ACCESS_TOKEN'):
@@ -39,11 +44,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Background batch job configuration
+BATCH_JOB_WORKERS = 2  # Batch jobs processed at the same time
+BATCH_JOB_RETENTION = 3600  # Seconds finished jobs stay available for polling
+
+_batch_jobs = {}  # job_id -> job state
+_batch_jobs_lock = threading.Lock()
+_batch_job_queue = queue.Queue()
+_batch_job_workers = []
+
 # Configuration - Always use real analysis
 print(f"✅ Real eBay AI Analyzer loaded - Full functionality enabled")
 print(f"✅ eBay API integration active")
 print(f"✅ Google Gemini AI scoring active")
 
+# Configure Gemini and build the scoring model once, before the first request arrives
+get_gemini_registry().warm()
+
+# Keep watched analyses (configured and frequently requested) fresh in the result cache
+get_cache_warmer().start()
+
 
 @app.route('/')
 def index():
@@ -69,7 +89,7 @@ def analyze_coin():
         # Run the complete real analysis with timeout
         try:
             logger.info("📊 Step 1: Calling complete_ebay_analysis...")
-            results = complete_ebay_analysis(
+            results, cache_info = complete_ebay_analysis_with_status(
                 search_query=search_query,
                 max_results=15,  # Increased for more data
                 min_confidence=30,  # Much lower threshold for more results
@@ -77,7 +97,7 @@ def analyze_coin():
             )
             
             analysis_time = time.time() - start_time
-            logger.info(f"✅ Analysis completed in {analysis_time:.2f} seconds")
+            logger.info(f"✅ Analysis completed in {analysis_time:.2f} seconds (cache: {cache_info['status']})")
             
         except Exception as analysis_error:
             logger.error(f"❌ Analysis failed: {analysis_error}")
@@ -123,17 +143,20 @@ def analyze_coin():
                         ]
                     },
                     'analysis_timestamp': datetime.now().isoformat()
-                }
+                },
+                'cache': cache_info
             })
         
-        # Add metadata
+        # Add metadata (copy first: results may be the shared cached dictionary)
+        results = dict(results)
         results['analysis_timestamp'] = datetime.now().isoformat()
         
         print(f"✅ Analysis complete for: {search_query}")
         
         return jsonify({
             'status': 'success',
-            'data': results
+            'data': results,
+            'cache': cache_info
         })
             
     except Exception as e:
@@ -193,6 +216,264 @@ def analyze_batch():
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
+@app.route('/api/analyze/batch/stream', methods=['POST'])
+def analyze_batch_stream():
+    """Stream batch results as NDJSON, one line per query as soon as it completes"""
+    data = request.get_json()
+    search_queries_text = (data or {}).get('search_queries', '').strip()
+    
+    if not search_queries_text:
+        return jsonify({
+            'error': 'Search queries are required (comma-separated)',
+            'status': 'error'
+        }), 400
+    
+    from Complete_Ebay_AI_Analyzer import parse_search_queries, iter_batch_ebay_analysis
+    
+    search_queries = parse_search_queries(search_queries_text)
+    
+    if not search_queries:
+        return jsonify({
+            'error': 'No valid search queries found',
+            'status': 'error'
+        }), 400
+    
+    def generate():
+        # Send a first line right away so clients and proxies see the response start
+        yield json.dumps({'type': 'start', 'total_queries': len(search_queries)}) + '\n'
+        
+        successful = 0
+        failed_queries = []
+        try:
+            for query, result, error in iter_batch_ebay_analysis(
+                search_queries=search_queries,
+                max_results=15,
+                min_confidence=30,
+                days_back=90
+            ):
+                if result:
+                    successful += 1
+                    yield json.dumps({'type': 'result', 'query': query, 'data': result}) + '\n'
+                else:
+                    failed_queries.append(query)
+                    yield json.dumps({'type': 'error', 'query': query, 'error': error}) + '\n'
+        except Exception as e:
+            logger.error(f"❌ Streaming batch analysis failed: {e}")
+            yield json.dumps({'type': 'error', 'query': None, 'error': f'Batch analysis failed: {str(e)}'}) + '\n'
+        
+        yield json.dumps({
+            'type': 'summary',
+            'total_queries': len(search_queries),
+            'successful_queries': successful,
+            'failed_queries': len(failed_queries),
+            'failed_query_list': failed_queries,
+            'batch_timestamp': datetime.now().isoformat()
+        }) + '\n'
+    
+    print(f"🚀 Streaming batch analysis of {len(search_queries)} queries...")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+    )
+
+# --- Background Batch Jobs ---
+
+def _purge_finished_jobs():
+    """Forget finished jobs older than BATCH_JOB_RETENTION."""
+    cutoff = time.time() - BATCH_JOB_RETENTION
+    with _batch_jobs_lock:
+        expired = [
+            job_id for job_id, job in _batch_jobs.items()
+            if job['finished_at'] is not None and job['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del _batch_jobs[job_id]
+
+def _ensure_job_workers():
+    """Start the batch job worker threads on first use."""
+    with _batch_jobs_lock:
+        if _batch_job_workers:
+            return
+        for i in range(BATCH_JOB_WORKERS):
+            worker = threading.Thread(target=_batch_job_worker, name=f'batch-job-worker-{i}', daemon=True)
+            worker.start()
+            _batch_job_workers.append(worker)
+
+def _batch_job_worker():
+    """Process queued batch jobs, recording each query's result as it completes."""
+    from Complete_Ebay_AI_Analyzer import iter_batch_ebay_analysis
+    
+    while True:
+        job_id = _batch_job_queue.get()
+        with _batch_jobs_lock:
+            job = _batch_jobs.get(job_id)
+            if job is not None:
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+                queries = list(job['search_queries'])
+        
+        if job is None:
+            _batch_job_queue.task_done()
+            continue
+        
+        logger.info(f"🚀 Batch job {job_id} started ({len(queries)} queries)")
+        try:
+            for query, result, error in iter_batch_ebay_analysis(
+                search_queries=queries,
+                max_results=15,
+                min_confidence=30,
+                days_back=90
+            ):
+                with _batch_jobs_lock:
+                    job['completed_queries'] += 1
+                    if result:
+                        job['results'][query] = result
+                        job['successful_queries'] += 1
+                    else:
+                        job['failed_query_list'].append(query)
+                        job['errors'][query] = error
+            
+            with _batch_jobs_lock:
+                job['status'] = 'completed'
+            logger.info(f"✅ Batch job {job_id} completed")
+        except Exception as e:
+            logger.error(f"❌ Batch job {job_id} failed: {e}")
+            with _batch_jobs_lock:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+        finally:
+            with _batch_jobs_lock:
+                job['finished_at'] = time.time()
+            _batch_job_queue.task_done()
+
+def _job_snapshot(job: dict) -> dict:
+    """Build the JSON-safe progress view of a job. Caller must hold _batch_jobs_lock."""
+    total = job['total_queries']
+    return {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'total_queries': total,
+        'completed_queries': job['completed_queries'],
+        'successful_queries': job['successful_queries'],
+        'failed_queries': len(job['failed_query_list']),
+        'failed_query_list': list(job['failed_query_list']),
+        'errors': dict(job['errors']),
+        'progress': round(job['completed_queries'] / total, 3) if total else 1.0,
+        'results': dict(job['results']),
+        'error': job['error'],
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat(),
+        'started_at': datetime.fromtimestamp(job['started_at']).isoformat() if job['started_at'] else None,
+        'finished_at': datetime.fromtimestamp(job['finished_at']).isoformat() if job['finished_at'] else None
+    }
+
+@app.route('/api/analyze/batch/jobs', methods=['POST'])
+def submit_batch_job():
+    """Queue a batch analysis and return a job ID immediately"""
+    try:
+        data = request.get_json()
+        search_queries_text = data.get('search_queries', '').strip()
+        
+        if not search_queries_text:
+            return jsonify({
+                'error': 'Search queries are required (comma-separated)',
+                'status': 'error'
+            }), 400
+        
+        from Complete_Ebay_AI_Analyzer import parse_search_queries
+        
+        search_queries = parse_search_queries(search_queries_text)
+        
+        if not search_queries:
+            return jsonify({
+                'error': 'No valid search queries found',
+                'status': 'error'
+            }), 400
+        
+        _purge_finished_jobs()
+        _ensure_job_workers()
+        
+        job_id = uuid.uuid4().hex
+        with _batch_jobs_lock:
+            _batch_jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'search_queries': search_queries,
+                'total_queries': len(search_queries),
+                'completed_queries': 0,
+                'successful_queries': 0,
+                'failed_query_list': [],
+                'errors': {},
+                'results': {},
+                'error': None,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None
+            }
+        _batch_job_queue.put(job_id)
+        
+        logger.info(f"📥 Queued batch job {job_id} ({len(search_queries)} queries)")
+        
+        return jsonify({
+            'status': 'accepted',
+            'job_id': job_id,
+            'total_queries': len(search_queries),
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+            
+    except Exception as e:
+        print(f"❌ Batch job submission failed: {e}")
+        return jsonify({
+            'error': f'Batch job submission failed: {str(e)}',
+            'status': 'error',
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+@app.route('/api/jobs/<job_id>')
+def get_batch_job(job_id):
+    """Return progress and partial results for a batch job"""
+    with _batch_jobs_lock:
+        job = _batch_jobs.get(job_id)
+        if job is None:
+            return jsonify({
+                'error': 'Job not found',
+                'status': 'error'
+            }), 404
+        snapshot = _job_snapshot(job)
+    
+    return jsonify({
+        'status': 'success',
+        'data': snapshot
+    })
+
+@app.route('/api/history')
+def price_history():
+    """Price-over-time for a query, answered from the local sales history (no eBay or AI calls)"""
+    search_query = request.args.get('query', '').strip()
+    if not search_query:
+        return jsonify({
+            'error': 'query parameter is required',
+            'status': 'error'
+        }), 400
+    
+    try:
+        days = int(request.args.get('days', 90))
+        min_confidence = float(request.args.get('min_confidence', 0))
+        history = get_sales_history().price_history(
+            search_query, days=days, bucket=request.args.get('bucket', 'day'), min_confidence=min_confidence
+        )
+    except ValueError as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 400
+    
+    return jsonify({
+        'status': 'success',
+        'data': history
+    })
+
 @app.route('/api/status')
 def api_status():
     """Check API status and configuration"""
@@ -201,6 +482,15 @@ def api_status():
         'mode': 'real_analysis',
         'ebay_api': 'active',
         'gemini_ai': 'active',
+        'result_cache': get_result_cache_stats(),
+        'score_cache': get_score_cache().stats(),
+        'sales_history': get_sales_history().stats(),
+        'delta_refresh': get_delta_refresh_stats(),
+        'cache_warmer': get_cache_warmer().stats(),
+        'in_flight_analyses': get_single_flight_stats(),
+        'batch_concurrency': get_concurrency_stats(),
+        'rate_limits': get_rate_limiter_stats(),
+        'gemini': get_gemini_registry().stats(),
         'timestamp': datetime.now().isoformat()
     })
 
@@ -269,29 +559,22 @@ def test_ai_api():
         
         logger.info(f"🧪 Testing Gemini AI API with: {test_text}")
         
-        # Import the AI components
-        import google.generativeai as genai
-        import os
-        
-        # Set up the API key
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
+        # Use the shared, already-configured Gemini client
+        gemini = get_gemini_registry()
+        if not gemini.configure():
             return jsonify({
                 'error': 'GEMINI_API_KEY not set',
                 'status': 'error'
             }), 500
         
-        genai.configure(api_key=api_key)
-        
         # Test the AI
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(f"Say hello to: {test_text}")
+        response = gemini.generate_content(f"Say hello to: {test_text}")
         
         return jsonify({
             'status': 'success',
             'test_text': test_text,
             'ai_response': response.text,
-            'model': 'gemini-2.5-flash'
+            'model': GEMINI_MODEL_NAME
         })
         
     except Exception as e:
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Vectorized price statistics for eBay AI Analyzer
+Turns scored listings into price/shipping/confidence arrays and computes
+confidence-weighted statistics with NumPy, so reports scale to large listing sets
+"""
+
+import time
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# Quantiles reported in the pricing analysis
+REPORT_QUANTILES = (0.25, 0.5, 0.75)
+
+def _to_float_array(values: List) -> np.ndarray:
+    """Convert price values (numbers or numeric strings, 'N/A' when missing) to floats with NaN for missing."""
+    try:
+        # Fast path: NumPy parses numeric strings in C
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        parsed = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = float(value)
+            except (TypeError, ValueError):
+                continue
+        return parsed
+
+def price_columns(listings: Iterable[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Extract column arrays from scored listings.
+
+    Args:
+        listings: Listings with soldPrice, shippingCost and confidence_analysis
+
+    Returns:
+        Dictionary of equal-length arrays: price, shipping (NaN when unknown) and
+        weight (confidence on a 0-1 scale); listings without a usable price are dropped
+    """
+    listings = list(listings)
+    prices = _to_float_array([listing.get('soldPrice', 'N/A') for listing in listings])
+    shipping = _to_float_array([listing.get('shippingCost', 'N/A') for listing in listings])
+    weights = np.fromiter(
+        (listing['confidence_analysis']['confidence_score'] for listing in listings),
+        dtype=float, count=len(listings)
+    ) / 100.0  # Convert to 0-1 scale
+
+    valid = np.isfinite(prices)
+    return {'price': prices[valid], 'shipping': shipping[valid], 'weight': weights[valid]}
+
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles) -> np.ndarray:
+    """
+    Interpolated weighted quantiles.
+    Each value sits at the midpoint of its weight on the cumulative weight axis and
+    quantiles are linearly interpolated between neighbours; with equal weights this
+    matches the unweighted (Hazen) percentile definition.
+    """
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    sorted_weights = weights[order]
+    cumulative = np.cumsum(sorted_weights) - 0.5 * sorted_weights
+    cumulative /= sorted_weights.sum()
+    return np.interp(np.asarray(quantiles, dtype=float), cumulative, sorted_values)
+
+def weighted_statistics(prices: np.ndarray, weights: np.ndarray, shipping: np.ndarray = None) -> Dict:
+    """
+    Confidence-weighted price statistics.
+
+    Args:
+        prices: Sold prices
+        weights: Non-negative weights (all-zero weights fall back to equal weights)
+        shipping: Optional shipping costs aligned with prices, NaN when unknown
+
+    Returns:
+        Dictionary with the report's pricing keys plus weighted spread and
+        shipping-inclusive totals; empty if there are no prices
+    """
+    if prices.size == 0:
+        return {}
+    if weights.sum() <= 0:
+        weights = np.ones_like(prices)
+
+    weighted_avg = np.average(prices, weights=weights)
+    p25, median, p75 = weighted_quantiles(prices, weights, REPORT_QUANTILES)
+    weighted_std = np.sqrt(np.average((prices - weighted_avg) ** 2, weights=weights))
+    weighted_mad = weighted_quantiles(np.abs(prices - median), weights, [0.5])[0]
+    min_price = prices.min()
+    max_price = prices.max()
+
+    stats = {
+        'weighted_average': round(float(weighted_avg), 2),
+        'median_price': round(float(median), 2),
+        'p25_price': round(float(p25), 2),
+        'p75_price': round(float(p75), 2),
+        'min_price': float(min_price),
+        'max_price': float(max_price),
+        'price_range': float(max_price - min_price),
+        'total_weighted_sales': int(prices.size),
+        'weighted_std': round(float(weighted_std), 2),
+        'weighted_mad': round(float(weighted_mad), 2)
+    }
+
+    if shipping is not None:
+        known = np.isfinite(shipping)
+        stats['listings_with_shipping'] = int(known.sum())
+        if known.any():
+            totals = prices[known] + shipping[known]
+            total_weights = weights[known] if weights[known].sum() > 0 else np.ones_like(totals)
+            stats['weighted_average_total'] = round(float(np.average(totals, weights=total_weights)), 2)
+            stats['median_total_price'] = round(float(weighted_quantiles(totals, total_weights, [0.5])[0]), 2)
+
+    return stats
+
+def listing_price_statistics(listings: Iterable[Dict]) -> Dict:
+    """Weighted price statistics for scored listings (the report's pricing_analysis)."""
+    columns = price_columns(listings)
+    return weighted_statistics(columns['price'], columns['weight'], columns['shipping'])
+
+def benchmark_price_statistics(sizes=(1000, 10000, 100000), repeat: int = 3, seed: int = 0) -> List[Dict]:
+    """
+    Time listing_price_statistics on synthetic listings of increasing size.
+
+    Args:
+        sizes: Listing counts to benchmark
+        repeat: Runs per size; the fastest is reported
+        seed: Random seed for the synthetic listings
+
+    Returns:
+        One dictionary per size with the best time and microseconds per listing
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        listings = [
+            {
+                'soldPrice': f"{price:.2f}",
+                'shippingCost': f"{ship:.2f}" if ship >= 1 else 'N/A',
+                'confidence_analysis': {'confidence_score': int(score)}
+            }
+            for price, ship, score in zip(
+                rng.lognormal(3.8, 0.4, size), rng.uniform(0, 8, size), rng.integers(30, 101, size)
+            )
+        ]
+
+        best = float('inf')
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            listing_price_statistics(listings)
+            best = min(best, time.perf_counter() - start)
+
+        results.append({
+            'listings': size,
+            'seconds': round(best, 4),
+            'microseconds_per_listing': round(best / size * 1e6, 3)
+        })
+
+    return results
+
+if __name__ == '__main__':
+    print("📈 Weighted price statistics benchmark")
+    for result in benchmark_price_statistics():
+        print(f"  {result['listings']:>7} listings: {result['seconds']:.4f}s "
+              f"({result['microseconds_per_listing']:.3f} µs/listing)")
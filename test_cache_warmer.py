@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Test that the background cache warmer recomputes watched analyses before they expire
+"""
+
+import Complete_Ebay_AI_Analyzer as analyzer
+
+def test_warmer_refreshes_entry_before_expiry(monkeypatch, tmp_path):
+    """A still-fresh entry near expiry is recomputed and its cache age resets"""
+    fetches = []
+
+    def fake_completed_sales(keywords, max_results=10, days_back=30):
+        fetches.append(keywords)
+        # Exact matches are decided by the rule engine, so no Gemini call is made
+        yield from (
+            {
+                'itemId': f'v1|{i}|0',
+                'title': '2004 American Silver Eagle NGC MS69',
+                'soldPrice': '45.00',
+                'shippingCost': '4.00',
+                'currency': 'USD',
+                'condition': 'Used',
+                'seller': f'seller{i}'
+            }
+            for i in range(3)
+        )
+
+    monkeypatch.setattr(analyzer, 'iter_completed_sales', fake_completed_sales)
+    monkeypatch.setattr(analyzer, 'SALES_HISTORY_ENABLED', False)
+    monkeypatch.setattr(analyzer, 'SCORE_CACHE_ENABLED', False)
+    cache = analyzer.AnalysisResultCache(ttl=600, stale_grace=3600)
+    monkeypatch.setattr(analyzer, '_result_cache', cache)
+
+    query = '2004 Silver Eagle MS69'
+    key = analyzer._analysis_cache_key(query, 15, 30, 90)
+    cache.set(key, {'search_query': query, 'seeded': True})
+    value, stored_at, size = cache._entries[key]
+    cache._entries[key] = (value, stored_at - 570, size)  # Fresh, but within the refresh-ahead window
+
+    warmer = analyzer.CacheWarmer(cache, [query], enabled=True)
+    assert warmer.run_once() == 1
+    assert fetches == [query]
+    assert cache.age(key) < 60
+    assert 'seeded' not in cache.get(key)